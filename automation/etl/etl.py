@@ -1,78 +1,380 @@
 import os
-import pandas as pd
-from tools.conn import get_sqlserver_connection, get_postgres_connection
-from tools.transform import transform_dataframe, transform_iri_dataframe
-from tools.load import load_to_postgres  # You can add load_to_sqlserver if needed
-from tqdm import tqdm
 import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 from datetime import date, timedelta
 
+# Heavy dependencies (pandas, SQLAlchemy, pyarrow, tqdm, the tools.* modules
+# built on them) are imported inside the methods that use them, and engines
+# are only created when a source is first used, so jobs that just load to
+# PostgreSQL start fast and never need the SQL Server ODBC driver.
+
+
+class _ConnectionSlots:
+    """
+    Counting semaphore that hands out several slots atomically, so a
+    multi-connection read never holds some slots while waiting for others.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.free = total
+        self.cond = threading.Condition()
+
+    @contextmanager
+    def hold(self, n: int = 1):
+        n = max(1, min(n, self.total))
+        with self.cond:
+            self.cond.wait_for(lambda: self.free >= n)
+            self.free -= n
+        try:
+            yield n
+        finally:
+            with self.cond:
+                self.free += n
+                self.cond.notify_all()
+
 
 class ETL:
     def __init__(self):
-        self.__sql_conn, self.__sql_creds = get_sqlserver_connection()
-        self.__pg_conn, self.__pg_creds = get_postgres_connection()
+        # Maximum concurrent extraction connections per source
+        self.max_connections = {
+            'sqlserver': int(os.getenv('SQLSERVER_MAX_CONNECTIONS', 4)),
+            'postgres': int(os.getenv('PG_MAX_CONNECTIONS', 4)),
+        }
+        self.__source_slots = {name: _ConnectionSlots(n) for name, n in self.max_connections.items()}
+
+        # How stream()/load() replace target tables: 'swap' loads a shadow table and
+        # renames it into place; 'replace' drops and recreates the table
+        self.load_mode = os.getenv('PG_LOAD_MODE', 'swap')
+
+        # SQLAlchemy engines and credentials, created on first use per source
+        self.__engines = {}
+        self.__creds = {}
+        self.__engine_lock = threading.Lock()
+        # Per-table extraction window: {table: {source_table, column, previous, low, high, rows}}
+        self.extract_windows = {}
+        # When set, loads leave the watermarks alone and commit_watermark() advances
+        # them once the work downstream of the load (e.g. a reporting refresh) succeeded
+        self.defer_watermarks = False
+        # Per-table extraction errors from the last extract() call
+        self.extract_errors = {}
+        # Rows committed per table, and per-table load errors, from the last stream()/load() call
+        self.loaded = {}
+        self.load_errors = {}
+        # Per-table Postgres column types derived from the source catalog
+        self.column_types = {}
+
+    def _source(self, source: str):
+        """
+        Return (engine, database name) for `source`, creating the engine on first use.
+        """
+        if source not in ('sqlserver', 'postgres'):
+            raise ValueError("source_db must be either 'sqlserver' or 'postgres'")
+
+        with self.__engine_lock:
+            if source not in self.__engines:
+                from tools.conn import get_sqlserver_connection, get_postgres_connection
+                connect = get_sqlserver_connection if source == 'sqlserver' else get_postgres_connection
+                self.__engines[source], self.__creds[source] = connect(pool_size=self.max_connections[source])
+        return self.__engines[source], self.__creds[source]['database']
+
+    def _iter_chunks(self, table: str, source: str = 'sqlserver', chunksize: int = 100_000,
+                     watermark_column: str = 'TransactionDate', until: date = None, partitioning: dict = None):
+        """
+        Yield the rows of `table` as DataFrame chunks of at most `chunksize` rows.
+
+        Only rows past the table's stored high-watermark are read (or from
+        yesterday on the very first run), up to but excluding `until` (default:
+        today, so a partially written day is never marked as done). The
+        window actually read is recorded in `self.extract_windows[table]`.
+
+        `partitioning` splits the read into key ranges fetched concurrently,
+        e.g. {'column': 'TransactionDate', 'kind': 'date', 'partitions': 4};
+        see tools.partition.probe_ranges for the kinds. Chunks still come out
+        in range order.
+        """
+        import pandas as pd
+        from tools.watermark import read_watermark
+        from tools.partition import probe_ranges, iter_partitioned_chunks
+
+        engine, db_name = self._source(source)
+        until = until or date.today()
+
+        previous = read_watermark(f"{db_name}.{table}", watermark_column)
+        if previous is None:
+            lower = f"\"{watermark_column}\" >= '{until - timedelta(days=1)}'"
+        else:
+            lower = f"\"{watermark_column}\" > '{previous}'"
+        print(f"🔖 {table}: resuming after {watermark_column} = {previous}")
+
+        where = f"{lower} AND \"{watermark_column}\" < '{until}'"
+        query = f"SELECT * FROM \"{table}\" WHERE {where}"
+        # query = f"SELECT * FROM \"{table}\""
+
+        window = {'source_table': f"{db_name}.{table}", 'column': watermark_column, 'previous': previous,
+                  'low': None, 'high': None, 'rows': 0}
+        self.extract_windows[table] = window
+        self._column_types(table, source)
+
+        if partitioning:
+            partitions = partitioning.get('partitions', 4)
+            with self.__source_slots[source].hold(partitions) as workers:
+                predicates = probe_ranges(engine, table, partitioning['column'], partitioning.get('kind', 'date'),
+                                          partitions, where)
+                print(f"🧩 {table}: reading {len(predicates)} range(s) over {workers} connection(s)")
+                chunks = iter_partitioned_chunks(engine, query + " AND ({partition})", predicates,
+                                                 chunksize=chunksize, workers=workers)
+                yield from self._track_window(chunks, window)
+        else:
+            with self.__source_slots[source].hold(1):
+                yield from self._track_window(pd.read_sql(query, engine, chunksize=chunksize), window)
+
+    def _column_types(self, table: str, source: str = 'sqlserver'):
+        """
+        Return (and cache) Postgres column types for `table` from the source catalog.
+        Returns None when they cannot be determined, so the loader infers them from the data.
+        """
+        if source == 'sqlserver' and table not in self.column_types:
+            from tools.schema import get_sqlserver_columns, postgres_types_from_sqlserver
+
+            engine, _ = self._source(source)
+            try:
+                self.column_types[table] = postgres_types_from_sqlserver(get_sqlserver_columns(engine, table))
+            except Exception as e:
+                print(f"⚠️ Could not read column types for {table}, inferring from data: {e}")
+                self.column_types[table] = None
+        return self.column_types.get(table)
+
+    @staticmethod
+    def _track_window(chunks, window: dict):
+        for chunk in chunks:
+            if len(chunk):
+                column = window['column']
+                low, high = chunk[column].min(), chunk[column].max()
+                window['low'] = low if window['low'] is None else min(window['low'], low)
+                window['high'] = high if window['high'] is None else max(window['high'], high)
+                window['rows'] += len(chunk)
+            yield chunk
+
+    def _advance_watermark(self, table: str, source: str = 'sqlserver'):
+        """
+        Return an `after_copy` callback that advances `table`'s watermark to the
+        highest value extracted in this run, inside the load transaction.
+
+        The window is looked up when the callback runs, not when it is created:
+        in stream() the extraction thread records it only after the load started.
+        Returns None with `self.defer_watermarks` (see commit_watermark).
+        """
+        if self.defer_watermarks:
+            return None
+        _, db_name = self._source(source)
+
+        def after_copy(cur):
+            from tools.watermark import advance_watermark
+
+            window = self.extract_windows.get(table)
+            if window and window['high'] is not None:
+                advance_watermark(cur, f"{db_name}.{table}", window['column'], window['high'])
+
+        return after_copy
+
+    def commit_watermark(self, table: str):
+        """
+        Advance `table`'s watermark to the highest value extracted in this run,
+        in its own transaction. Used with `defer_watermarks`, so rows are only
+        marked as done once everything built from them has been refreshed;
+        until then every run re-extracts them.
+        """
+        from tools.conn import pg_connection
+        from tools.watermark import advance_watermark
+
+        window = self.extract_windows.get(table)
+        if not window or window['high'] is None:
+            return
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                advance_watermark(cur, window['source_table'], window['column'], window['high'])
+
+    def _extract_table(self, table: str, source: str, path: str, chunksize: int, position: int = 0,
+                       partitioning: dict = None, staging_format: str = None):
+        """
+        Extract one table to the staging file at `path` and return it as a DataFrame.
+        """
+        from tqdm import tqdm
+        from tools.staging import DEFAULT_FORMAT, StagingWriter, read_staged
 
-    def extract(self, tables: list, source: str = 'sqlserver', output_dir: str = './exported_tables', chunksize: int = 100_000) -> dict:
+        staging_format = staging_format or DEFAULT_FORMAT
+        with StagingWriter(path, fmt=staging_format) as writer:
+            with tqdm(desc=table, unit="row", position=position, leave=False) as progress:
+                for chunk in self._iter_chunks(table, source, chunksize, partitioning=partitioning):
+                    writer.write(chunk)
+                    progress.update(len(chunk))
+
+        print(f"✓ Finished {table}: {writer.rows} rows written to {path}")
+        return read_staged(path)
+
+    def staged_path(self, table: str, source: str = 'sqlserver', output_dir: str = './exported_tables',
+                    staging_format: str = None) -> str:
+        """
+        Return where extract() stages `table` from `source`.
+        """
+        from tools.staging import DEFAULT_FORMAT, staging_path
+
+        _, db_name = self._source(source)
+        return staging_path(output_dir, db_name, table, staging_format or DEFAULT_FORMAT)
+
+    def read_staged(self, table: str, source: str = 'sqlserver', columns: list = None,
+                    output_dir: str = './exported_tables', staging_format: str = None):
+        """
+        Read a previously staged table, optionally only some of its columns.
+        """
+        from tools.staging import read_staged
+
+        return read_staged(self.staged_path(table, source, output_dir, staging_format), columns=columns)
+
+    def extract(self, tables: list, source: str = 'sqlserver', output_dir: str = './exported_tables', chunksize: int = 100_000,
+                max_workers: int = 1, partitioning: dict = None, staging_format: str = None,
+                reuse_staged: bool = False) -> dict:
         """
         Efficiently extract large tables in chunks using SQLAlchemy.
-        Overwrites existing CSVs if they already exist.
+        Each table is staged under `output_dir` as typed, zstd-compressed Parquet
+        (or CSV when pyarrow is unavailable), overwriting any previous file.
+        With `reuse_staged`, tables that already have a staging file are read
+        from it instead of the source.
+
+        With `max_workers` > 1, tables are extracted in parallel, never using more
+        than `self.max_connections[source]` connections to the source at once.
+        Failures are reported per table and kept in `self.extract_errors`.
+        `partitioning` additionally splits each table into parallel key-range reads.
         """
+        from tqdm import tqdm
+        from tools.staging import read_staged
+
         os.makedirs(output_dir, exist_ok=True)
         dataframes = {}
+        self.extract_errors = {}
 
-        if source == 'sqlserver':
-            engine = self.__sql_conn
-            db_name = self.__sql_creds['database']
-        elif source == 'postgres':
-            engine = self.__pg_conn
-            db_name = self.__pg_creds['database']
-        else:
-            raise ValueError("source_db must be either 'sqlserver' or 'postgres'")
-        
-        yesterday = date.today() - timedelta(days=1)
+        workers = max(1, min(max_workers, self.max_connections[source], len(tables)))
 
-        print(f"\n📦 Starting extraction from {source}...\n")
+        print(f"\n📦 Starting extraction from {source} ({workers} worker(s))...\n")
 
-        for table in tqdm(tables, desc="Extracting tables", unit="table"):
-            print(f"\n📥 Extracting: {table} from {source}")
-            csv_path = os.path.join(output_dir, f"{db_name}_{table}.csv")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"extract-{source}") as pool:
+            futures = {}
+            for position, table in enumerate(tables):
+                path = self.staged_path(table, source, output_dir, staging_format)
+                if reuse_staged and os.path.exists(path):
+                    print(f"\n♻️ Reusing staged {table}: {path}")
+                    futures[pool.submit(read_staged, path)] = table
+                    continue
+                print(f"\n📥 Extracting: {table} from {source}")
+                futures[pool.submit(self._extract_table, table, source, path, chunksize, position % workers,
+                                    partitioning, staging_format)] = table
 
-            # ✅ Remove existing file to start fresh
-            if os.path.exists(csv_path):
-                os.remove(csv_path)
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Extracting tables", unit="table"):
+                table = futures[future]
+                try:
+                    dataframes[table] = future.result()
+                except Exception as e:
+                    self.extract_errors[table] = e
+                    print(f"✗ Failed to extract {table}: {e}")
 
-            try:
-                total_rows = 0
-                first_chunk = True
-                chunk_num = 0
+        if self.extract_errors:
+            print(f"⚠️ {len(self.extract_errors)} of {len(tables)} tables failed: {', '.join(self.extract_errors)}")
+
+        return dataframes
+
+    def stream(self, tables: list, source: str = 'sqlserver', target: str = 'postgres', chunksize: int = 100_000, queue_size: int = 2,
+               partitioning: dict = None) -> dict:
+        """
+        Extract, transform and load each table chunk by chunk, without staging files.
+
+        A background thread reads and transforms chunks from the source and hands
+        them to the loader through a bounded queue, so the extraction of chunk N+1
+        overlaps the COPY of chunk N and at most `queue_size` + 2 chunks are in
+        memory at once. Duplicate rows are dropped across the whole table, as in
+        transform(), by remembering a hash of every row (see drop_seen_duplicates).
+        `partitioning` reads each table as parallel key ranges (see _iter_chunks).
+
+        Tables that fail are reported and kept in `self.load_errors`; only
+        committed loads appear in the result (and in `self.loaded`). Both are
+        updated per table, so a rerun can stream just the tables that failed.
+
+        Returns:
+            dict: Number of rows loaded per table.
+        """
+        if target != 'postgres':
+            raise NotImplementedError("Only PostgreSQL loading is implemented. Add more loaders if needed.")
 
+        from tools.transform import transform_dataframe, drop_seen_duplicates
+        from tools.load import load_stream_to_postgres
 
-                
-                query = f"SELECT * FROM \"{table}\" WHERE \"TransactionDate\" >= '{yesterday}'"
-                # query = f"SELECT * FROM \"{table}\" WHERE \"TransactionDate\" >= '{yesterday}'"
-                # query = f"SELECT * FROM \"{table}\""
+        loaded = {}
+        print(f"\n📦 Starting streaming ETL from {source} to {target}...\n")
 
-                for chunk in pd.read_sql(query, engine, chunksize=chunksize):
-                    chunk_num += 1
-                    chunk.to_csv(csv_path, mode='a', index=False, header=first_chunk)
-                    total_rows += len(chunk)
-                    first_chunk = False
-                    print(f"  ↪ Chunk {chunk_num}: saved {len(chunk)} rows")
+        for table in tables:
+            print(f"\n🌊 Streaming: {table} from {source}")
+            self.loaded.pop(table, None)
+            self.load_errors.pop(table, None)
+            chunks = queue.Queue(maxsize=queue_size)
+            done = object()
+            stop = threading.Event()
 
+            def put(item, chunks=chunks, stop=stop):
+                # Give up once the loader has stopped consuming
+                while not stop.is_set():
+                    try:
+                        chunks.put(item, timeout=1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
 
+            def produce(table=table):
+                seen = set()
+                try:
+                    for chunk in self._iter_chunks(table, source, chunksize, partitioning=partitioning):
+                        if not put(transform_dataframe(drop_seen_duplicates(chunk, seen))):
+                            return
+                    put(done)
+                except Exception as e:
+                    put(e)
 
-                print(f"✓ Finished {table}: {total_rows} rows written to {csv_path}")
-                dataframes[table] = pd.read_csv(csv_path)
+            def consume(chunks=chunks):
+                while True:
+                    item = chunks.get()
+                    if item is done:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+
+            producer = threading.Thread(target=produce, name=f"extract-{table}", daemon=True)
+            producer.start()
+            try:
+                loaded[table] = self.loaded[table] = load_stream_to_postgres(
+                    consume(), table_name=table, if_exists=self.load_mode,
+                    after_copy=self._advance_watermark(table, source),
+                    column_types=self._column_types(table, source)
+                )
             except Exception as e:
-                print(f"✗ Failed to extract {table}: {e}")
+                self.load_errors[table] = e
+                print(f"✗ Failed to stream {table}: {e}")
+            finally:
+                stop.set()
+                producer.join()
+
+        return loaded
 
-        return dataframes
     def transform(self, dataframes: dict) -> dict:
         """
         Apply transformations to each DataFrame.
         """
+        from tools.transform import transform_dataframe
+
         transformed = {}
         for table, df in dataframes.items():
             print(f"🔄 Transforming {table}...")
@@ -84,6 +386,8 @@ class ETL:
         """
         Apply transformations to each DataFrame.
         """
+        from tools.transform import transform_iri_dataframe
+
         transformed = {}
         for table, df in dataframes.items():
             print(f"🔄 Transforming {table}...")
@@ -91,30 +395,67 @@ class ETL:
             transformed[table] = transformed_df
         return transformed
 
-    def load(self, dataframes: dict, target: str = 'postgres'):
+    def load(self, dataframes: dict, target: str = 'postgres', source: str = 'sqlserver'):
         """
         Load the given DataFrames into the target database.
+        Watermarks of extracted tables are advanced in the same transaction as their COPY.
+        Failures are reported per table and kept in `self.load_errors`.
+
+        Returns:
+            dict: Number of rows committed per table.
         """
+        from tools.load import load_to_postgres
+
+        if target != 'postgres':
+            raise NotImplementedError("Only PostgreSQL loading is implemented. Add more loaders if needed.")
+
+        self.loaded, self.load_errors = {}, {}
         for table, df in dataframes.items():
             print(f"🚚 Loading table: {table} into {target}")
-            if target == 'postgres':
-                load_to_postgres(df, table_name=table)
-            else:
-                raise NotImplementedError("Only PostgreSQL loading is implemented. Add more loaders if needed.")
-    def load_pmr(self, dataframes: dict, target: str = 'postgres'):
+            try:
+                self.loaded[table] = load_to_postgres(df, table_name=table, if_exists=self.load_mode,
+                                                      after_copy=self._advance_watermark(table, source),
+                                                      column_types=self.column_types.get(table))
+            except Exception as e:
+                self.load_errors[table] = e
+                print(f"✗ Failed to load {table}: {e}")
+        return self.loaded
+
+    def load_pmr(self, dataframes: dict, target: str = 'postgres', key_columns: tuple = ('id',)):
         """
         Load the given DataFrames into the target database.
+        Rows are merged on `key_columns`, so reloading the same day does not duplicate them.
         """
+        from tools.load import load_to_postgres
+
         for table, df in dataframes.items():
             print(f"🚚 Loading table: {table} into {target}")
             if target == 'postgres':
-                load_to_postgres(df, table_name=table, if_exists='')
+                load_to_postgres(df, table_name=table, if_exists='merge', key_columns=list(key_columns))
             else:
                 raise NotImplementedError("Only PostgreSQL loading is implemented. Add more loaders if needed.")
+
+    def load_pmr_stream(self, chunks, table: str = 'pmr', key_columns: tuple = ('id',), column_types: dict = None):
+        """
+        Merge an iterable of PMR DataFrame batches into `table` as they arrive,
+        one COPY per batch into a single merge stage (see load_stream_to_postgres).
+        `column_types` types the table when it is first created.
+
+        Returns:
+            int: Rows copied.
+        """
+        from tools.load import load_stream_to_postgres
+
+        print(f"🚚 Streaming table: {table} into postgres")
+        return load_stream_to_postgres(chunks, table_name=table, if_exists='merge', key_columns=list(key_columns),
+                                       column_types=column_types)
+
     def close(self):
         """
-        Close both SQL Server and PostgreSQL connections.
+        Close both SQL Server and PostgreSQL connections (if they were ever opened).
         """
-        self.__sql_conn.dispose()
-        self.__pg_conn.dispose()
+        with self.__engine_lock:
+            for engine in self.__engines.values():
+                engine.dispose()
+            self.__engines.clear()
 
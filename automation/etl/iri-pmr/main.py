@@ -1,12 +1,15 @@
 import sys
 import os
+from dotenv import load_dotenv
 
-import psycopg2
+# Load .env before the tools read their settings from the environment
+load_dotenv()
 
 # Add parent directory to import path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from etl import ETL 
+from tools.profiling import profile_tables, columns_with_nulls
     # Define the tables you want to extract
 tables_to_extract = [
     # "iri category-brand total market 2023"
@@ -28,40 +31,23 @@ tables_to_extract = [
     "StoreSalesByUPC_2024_to_Q1_2025"
 ]
 
-def get_tables_with_nulls(tables):
-    import psycopg2
-
-    user = os.getenv("PG_USER")
-    password = os.getenv("PG_PASSWORD")
-    host = os.getenv("PG_HOST")
-    port = os.getenv("PG_PORT", 5432)
-    database = os.getenv("PG_DB")
-
-    conn = psycopg2.connect(
-        dbname=database, user=user, password=password, host=host, port=port
-    )
-    cursor = conn.cursor()
+# Read tables from their existing staging files instead of re-extracting them
+# (for reruns over the same data; a stale file is otherwise reused silently)
+REUSE_STAGED = os.getenv('IRI_REUSE_STAGED', 'false').lower() in ('1', 'true', 'yes')
+# Directory of the per-table CSV exports
+EXPORT_DIR = os.getenv('IRI_EXPORT_DIR', '.')
 
+def get_tables_with_nulls(tables):
+    """
+    Return the tables that contain NULLs, profiling each table in a single scan
+    (unchanged tables reuse their cached profile, see tools/profiling.py).
+    """
     tables_with_nulls = []
-
-    for table in tables:
-        cursor.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_schema = 'public' AND table_name = %s
-        """, (table.lower(),))
-        columns = [row[0] for row in cursor.fetchall()]
-
-        for col in columns:
-            cursor.execute(f'SELECT 1 FROM "{table}" WHERE "{col}" IS NULL LIMIT 1')
-            if cursor.fetchone():
-                print(f"⚠️ NULL found in table '{table}', column '{col}'")
-                tables_with_nulls.append(table)
-                break  # No need to check other columns for this table
-
-    cursor.close()
-    conn.close()
-
+    for table, profile in profile_tables(tables).items():
+        null_columns = columns_with_nulls(profile)
+        if null_columns:
+            print(f"⚠️ NULL found in table '{table}', columns {null_columns}")
+            tables_with_nulls.append(table)
     return tables_with_nulls
 
 
@@ -73,11 +59,15 @@ def main(tables_with_nulls):
     source_server = 'postgres'   # or 'postgres'
     target_server = 'postgres'    # or extend to 'sqlserver' if implemented
 
-    # Step 1: Extract data from the source DB
-    extracted_data = etl.extract(tables=tables_with_nulls, source=source_server, output_dir='./exported_tables')
+    # Step 1: Extract data from the source DB (with IRI_REUSE_STAGED, read the typed staging files instead)
+    extracted_data = etl.extract(tables=tables_with_nulls, source=source_server, output_dir='./exported_tables',
+                                 reuse_staged=REUSE_STAGED)
     
-    # Save to CSV
-    extracted_data.to_csv('upc.csv', index=False)
+    # Save each table to its own CSV
+    for table, df in extracted_data.items():
+        path = os.path.join(EXPORT_DIR, f"{table}.csv")
+        df.to_csv(path, index=False)
+        print(f"💾 Saved {len(df)} rows of {table} to {path}")
 
     # # Step 2: Transform the extracted data
     # transformed_data = etl.transform_iri(extracted_data)
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Add parent directory to import path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from etl import ETL
+from tools.pmr import fetch_pmr, load_pmr_file
+
+# Backfill PMR shelf data for a date range.
+#
+# The range is split into windows of --window-days that are downloaded
+# concurrently into the PMR cache (at most --workers at a time, and no more
+# than --rate requests per second overall). Failed requests are retried with
+# exponential backoff. Merges into Postgres stream from the cached files one at
+# a time: they upsert into the same table, and the download is the slow part.
+#
+# Every loaded window is recorded in a checkpoint file, so a rerun of the same
+# command only fetches the windows that have not been loaded yet.
+#
+# Usage:
+#   python pmr/backfill.py --start 2025-04-01 --end 2025-06-30 [--window-days 7 --workers 4 --rate 2]
+#   PMR_URL=http://localhost:8000/shelf python pmr/backfill.py ...   (against a stub server)
+
+BACKFILL_WORKERS = int(os.getenv('PMR_BACKFILL_WORKERS', 4))
+BACKFILL_RATE = float(os.getenv('PMR_BACKFILL_RATE', 2))
+BACKFILL_RETRIES = int(os.getenv('PMR_BACKFILL_RETRIES', 4))
+BACKFILL_BACKOFF = float(os.getenv('PMR_BACKFILL_BACKOFF', 2))
+CHECKPOINT_FILE = os.getenv('PMR_CHECKPOINT_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'backfill_checkpoint.json'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """
+    Spaces calls to wait() at least 1/`rate` seconds apart, across threads.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(self.next_at, now)
+            self.next_at = at + self.interval
+        time.sleep(at - now)
+
+
+def date_windows(start, end, days):
+    """
+    Split [start, end] into consecutive (first, last) windows of at most `days` days.
+    """
+    windows = []
+    while start <= end:
+        last = min(start + timedelta(days=days - 1), end)
+        windows.append((start, last))
+        start = last + timedelta(days=1)
+    return windows
+
+
+def window_key(first, last):
+    return f"{first}..{last}"
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    # Write a temp file and rename it, so an interrupted run never leaves half a file
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def fetch_window(first, last, limiter, retries=BACKFILL_RETRIES, backoff=BACKFILL_BACKOFF, refresh=False):
+    """
+    Download one window into the PMR cache, retrying throttled/failed requests
+    with exponential backoff (honouring Retry-After). With `refresh`, a cached
+    copy is ignored and the window is downloaded again.
+
+    Returns:
+        str: Path of the cached export (see tools.pmr.fetch_pmr).
+    """
+    for attempt in range(retries + 1):
+        limiter.wait()
+        retry_after = None
+        try:
+            return fetch_pmr(first, last, refresh=refresh)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code not in RETRY_STATUSES or attempt == retries:
+                raise
+            header = e.response.headers.get('Retry-After', '')
+            retry_after = float(header) if header.isdigit() else None
+            error = e
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == retries:
+                raise
+            error = e
+        delay = retry_after if retry_after is not None else backoff * 2 ** attempt + random.uniform(0, 1)
+        print(f"🔁 {window_key(first, last)}: {error}; retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+        time.sleep(delay)
+
+
+def backfill(start, end, window_days=7, workers=BACKFILL_WORKERS, rate=BACKFILL_RATE,
+             checkpoint_file=CHECKPOINT_FILE, force=False):
+    """
+    Fetch and merge PMR data for [start, end] window by window, skipping the
+    windows already recorded in `checkpoint_file`. With `force`, every window
+    is downloaded again (bypassing the cache) and reloaded; entries for
+    windows outside the range are kept in the checkpoint either way.
+
+    Returns:
+        dict: {window: error message} for the windows that failed (empty on success).
+    """
+    checkpoint = load_checkpoint(checkpoint_file)
+    windows = [w for w in date_windows(start, end, window_days) if force or window_key(*w) not in checkpoint]
+    print(f"📅 PMR backfill {start} → {end}: {len(windows)} windows to fetch "
+          f"({workers} workers, {rate} req/s)")
+
+    limiter = RateLimiter(rate)
+    load_lock = threading.Lock()
+    etl = ETL()
+    failed = {}
+
+    def run(first, last):
+        t0 = time.perf_counter()
+        path = fetch_window(first, last, limiter, refresh=force)
+        with load_lock:
+            rows = load_pmr_file(etl, path, window_key(first, last))
+            checkpoint[window_key(first, last)] = {'rows': rows, 'loaded_at': datetime.now().isoformat(timespec='seconds')}
+            save_checkpoint(checkpoint_file, checkpoint)
+        return rows, time.perf_counter() - t0
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run, first, last): window_key(first, last) for first, last in windows}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    rows, seconds = future.result()
+                    print(f"✅ {key}: {rows} rows in {seconds:.1f}s")
+                except Exception as e:
+                    failed[key] = str(e)
+                    print(f"❌ {key}: {e}")
+    finally:
+        etl.close()
+
+    print(f"📦 Backfill done: {len(windows) - len(failed)} windows loaded, {len(failed)} failed")
+    return failed
+
+
+if __name__ == "__main__":
+    yesterday = date.today() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Backfill PMR shelf data for a date range.")
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument('--end', default=yesterday, type=date.fromisoformat, help="last day (default: yesterday)")
+    parser.add_argument('--window-days', type=int, default=7, help="days per request (default: 7)")
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS, help="concurrent requests")
+    parser.add_argument('--rate', type=float, default=BACKFILL_RATE, help="max requests per second")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help="checkpoint file")
+    parser.add_argument('--force', action='store_true', help="ignore the checkpoint and refetch every window")
+    args = parser.parse_args()
+
+    failures = backfill(args.start, args.end, args.window_days, args.workers, args.rate, args.checkpoint, args.force)
+    sys.exit(1 if failures else 0)
@@ -1,47 +1,55 @@
-import sys 
+import sys
 import os
+from dotenv import load_dotenv
+
+# Load .env before the tools read their settings from the environment
+load_dotenv()
+
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from tools.conn import get_sqlserver_connection
+from tools.schema import get_sqlserver_columns, postgres_types_from_sqlserver, create_table_sql
 
 
 
-def get_create_table_query(table_name, schema='dbo'):
+def get_create_table_query(table_name, schema='dbo', target='sqlserver'):
+    """
+    Print (and return) a CREATE TABLE script for a SQL Server table.
+    With target='postgres' the script uses the equivalent PostgreSQL types,
+    as the loader does.
+    """
     conn, creds = get_sqlserver_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, IS_NULLABLE
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?
-        ORDER BY ORDINAL_POSITION
-    """, (schema, table_name))
-
-    columns = cursor.fetchall()
+    columns = get_sqlserver_columns(conn, table_name, schema)
     if not columns:
         print(f"⚠️ Table '{schema}.{table_name}' not found.")
+        conn.dispose()
         return
 
-    col_defs = []
-    for col in columns:
-        col_name, data_type, max_len, is_nullable = col
-        if data_type in ['varchar', 'nvarchar', 'char', 'nchar']:
-            type_def = f"{data_type}({max_len if max_len else 'MAX'})"
-        elif data_type in ['decimal', 'numeric']:
-            # You could expand with precision/scale lookup if needed
-            type_def = f"{data_type}(18, 2)"
-        else:
-            type_def = data_type
-
-        nullable = "NULL" if is_nullable == 'YES' else "NOT NULL"
-        col_defs.append(f"[{col_name}] {type_def} {nullable}")
-
-    create_stmt = f"CREATE TABLE [{schema}].[{table_name}] (\n    " + ",\n    ".join(col_defs) + "\n);"
+    if target == 'postgres':
+        create_stmt = create_table_sql(f'"{table_name}"', [col['name'] for col in columns],
+                                       postgres_types_from_sqlserver(columns)) + ";"
+    else:
+        col_defs = []
+        for col in columns:
+            data_type, max_len = col['data_type'], col['max_length']
+            if data_type in ['varchar', 'nvarchar', 'char', 'nchar']:
+                type_def = f"{data_type}({max_len if max_len and max_len > 0 else 'MAX'})"
+            elif data_type in ['decimal', 'numeric']:
+                type_def = f"{data_type}({col['precision'] or 18}, {col['scale'] or 0})"
+            else:
+                type_def = data_type
+
+            nullable = "NULL" if col['nullable'] else "NOT NULL"
+            col_defs.append(f"[{col['name']}] {type_def} {nullable}")
+
+        create_stmt = f"CREATE TABLE [{schema}].[{table_name}] (\n    " + ",\n    ".join(col_defs) + "\n);"
+
     print("\n🔧 CREATE TABLE Script:")
     print(create_stmt)
 
-    cursor.close()
-    conn.close()
+    conn.dispose()
+    return create_stmt
 
 # Example usage
 if __name__ == "__main__":
-    get_create_table_query("StoreSaleByDept")
\ No newline at end of file
+    get_create_table_query("StoreSaleByDept")
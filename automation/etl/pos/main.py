@@ -1,14 +1,26 @@
 import sys
 import os
 
-import psycopg2
 
 from datetime import date, timedelta
+from dotenv import load_dotenv
+
+# Load .env before the tools read their settings from the environment
+load_dotenv()
 
 # Add parent directory to import path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from etl import ETL 
+from tools.conn import pg_connection, close_pg_pool
+from tools.storesales import refresh_store_sales
+from tools.pgpartitions import prepare_partitions
+from tools.maintenance import run_maintenance
+from tools.rollups import ROLLUPS, refresh_rollups
+from tools.bitables import BI_ROUTES
+from tools.sqlregistry import execute
+from tools.profiling import profile_tables, columns_with_nulls
+from tools.dag import Step, run_dag
     # Define the tables you want to extract
 tables_to_extract = [
     # "iri category-brand total market 2023",
@@ -31,317 +43,208 @@ tables_to_extract = [
     'DailyTotals_Products_By_SKU'
 ]
 
-def get_tables_with_nulls(tables):
-    import psycopg2
-
-    user = os.getenv("PG_USER")
-    password = os.getenv("PG_PASSWORD")
-    host = os.getenv("PG_HOST")
-    port = os.getenv("PG_PORT", 5432)
-    database = os.getenv("PG_DB")
+# Stream chunks straight from SQL Server into Postgres instead of staging CSVs
+use_streaming = True
 
-    conn = psycopg2.connect(
-        dbname=database, user=user, password=password, host=host, port=port
-    )
-    cursor = conn.cursor()
+# Pipeline DAG: concurrent steps, per-step timeout (seconds) and retries
+DAG_WORKERS = int(os.getenv('POS_DAG_WORKERS', 4))
+STEP_TIMEOUT = float(os.getenv('POS_STEP_TIMEOUT')) if os.getenv('POS_STEP_TIMEOUT') else None
+STEP_RETRIES = int(os.getenv('POS_STEP_RETRIES', 1))
 
+def get_tables_with_nulls(tables):
+    """
+    Return the tables that contain NULLs, profiling each table in a single scan
+    (unchanged tables reuse their cached profile, see tools/profiling.py).
+    """
     tables_with_nulls = []
+    for table, profile in profile_tables(tables).items():
+        null_columns = columns_with_nulls(profile)
+        if null_columns:
+            print(f"⚠️ NULL found in table '{table}', columns {null_columns}")
+            tables_with_nulls.append(table)
+    return tables_with_nulls
 
-    for table in tables:
-        cursor.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_schema = 'public' AND table_name = %s
-        """, (table.lower(),))
-        columns = [row[0] for row in cursor.fetchall()]
+def updateBITables(start, end):
+    """
+    Copy the staged DailyTotals rows with TransactionDate in [start, end] into the BI tables,
+    replacing whatever those tables already held for that window (in one transaction).
+    The source window is scanned once and fanned out to all three tables (see tools/bitables.py).
+    """
+    params = {'start': start, 'end': end, 'after': str(date.fromisoformat(end) + timedelta(days=1))}
+    with pg_connection() as conn:
+        cursor = conn.cursor()
 
-        for col in columns:
-            cursor.execute(f'SELECT 1 FROM "{table}" WHERE "{col}" IS NULL LIMIT 1')
-            if cursor.fetchone():
-                print(f"⚠️ NULL found in table '{table}', column '{col}'")
-                tables_with_nulls.append(table)
-                break  # No need to check other columns for this table
+        # Monthly Sales_Date partitions must exist before the window is inserted
+        for bi_table, _ in BI_ROUTES.values():
+            prepare_partitions(cursor, bi_table, start, end)
 
-    cursor.close()
-    conn.close()
+        # Replace the whole date window so a rerun never duplicates rows
+        for route, (bi_table, _) in BI_ROUTES.items():
+            execute(cursor, f"bi_delete_window_{route}", params)
+            print(f"Cleared {cursor.rowcount} existing rows from {bi_table}")
 
-    return tables_with_nulls
+        execute(cursor, "bi_fan_out", params)
+        for route, rows in cursor.fetchall():
+            print(f"➕ Inserted {rows} rows into {BI_ROUTES[route][0]}")
 
-def updateBITables():
-    import psycopg2
-
-    user = os.getenv("PG_USER")
-    password = os.getenv("PG_PASSWORD")
-    host = os.getenv("PG_HOST")
-    port = os.getenv("PG_PORT", 5432)
-    database = os.getenv("PG_DB")
-
-    conn = psycopg2.connect(
-        dbname=database, user=user, password=password, host=host, port=port
-    )
-    cursor = conn.cursor()
-
-    yesterday = date.today() - timedelta(days=1)
-
-    # cursor.execute(f"""
-    # INSERT INTO "StoreSaleByDept_2024_to_Q1_2025" (
-    # "Sales_Date", "Store", "SKU",
-    # "Qty_Sold", "Total_Sold", "Weight_Sold", "PRO5_ProductId"
-    # )
-    # SELECT
-    # TO_TIMESTAMP("TransactionDate", 'YYYY-MM-DD'),
-    # "LocationId"::bigint, "SKU"::bigint,
-    # "QtySold"::numeric, "TotalSold"::numeric, "WeightSold"::numeric, "PRO5_ProductId"::numeric
-    # FROM "DailyTotals_Products_By_SKU"
-    # WHERE TO_DATE("TransactionDate", 'YYYY-MM-DD') >= DATE '{yesterday}'
-    # AND "SKU"::bigint < 100
-    # AND "PRO5_ProductId"::numeric = 0.0;
-    # """)
-    cursor.execute(f"""
-    INSERT INTO "StoreSaleByDept_2024_to_Q1_2025" (
-    "Sales_Date", "Store", "SKU",
-    "Qty_Sold", "Total_Sold", "Weight_Sold", "PRO5_ProductId"
-    )
-    SELECT
-    TO_TIMESTAMP("TransactionDate", 'YYYY-MM-DD'),
-    "LocationId"::bigint, "SKU"::bigint,
-    "QtySold"::numeric, "TotalSold"::numeric, "WeightSold"::numeric, "PRO5_ProductId"::numeric
-    FROM "DailyTotals_Products_By_SKU"
-    WHERE TO_DATE("TransactionDate", 'YYYY-MM-DD') >= DATE '{yesterday}'
-    AND "SKU"::bigint < 100
-    AND "PRO5_ProductId"::numeric = 0.0;
-    """)
-    print("Query #1 Done")
-    # cursor.execute(f"""
-    # INSERT INTO "StoreSalesByUPC_2024_to_Q1_2025" (
-    # "Sales_Date", "Store", "SBO_ProductId", "PRO5_ProductId", "SKU",
-    # "Prod_Brand", "Prod_Descr", "Prod_PackSize", "ItemGroup",
-    # "Department", "SubDepartment", "POSDepartment",
-    # "Qty_Sold", "Total_Sold", "Weight_Sold"
-    # )
-    # SELECT
-    # "TransactionDate", "LocationId"::bigint, "SBO_ProductId"::numeric, "PRO5_ProductId"::numeric, "SKU"::bigint,
-    # "Brand", "Description", "PackSize", "ItemGroup",
-    # "Department", "SubDepartment", "POSDepartment",
-    # "QtySold"::numeric, "TotalSold"::numeric, "WeightSold"::numeric
-    # FROM "DailyTotals_Products_By_SKU"
-    # WHERE TO_DATE("TransactionDate", 'YYYY-MM-DD') >= DATE '{yesterday}' AND "SKU"::bigint>=100 AND "PRO5_ProductId"::numeric != 0.0;
-    # """)
-    cursor.execute(f"""
-    INSERT INTO "StoreSalesByUPC_2024_to_Q1_2025" (
-    "Sales_Date", "Store", "SBO_ProductId", "PRO5_ProductId", "SKU",
-    "Prod_Brand", "Prod_Descr", "Prod_PackSize", "ItemGroup",
-    "Department", "SubDepartment", "POSDepartment",
-    "Qty_Sold", "Total_Sold", "Weight_Sold"
-    )
-    SELECT
-    "TransactionDate", "LocationId"::bigint, "SBO_ProductId"::numeric, "PRO5_ProductId"::numeric, "SKU"::bigint,
-    "Brand", "Description", "PackSize", "ItemGroup",
-    "Department", "SubDepartment", "POSDepartment",
-    "QtySold"::numeric, "TotalSold"::numeric, "WeightSold"::numeric
-    FROM "DailyTotals_Products_By_SKU"
-    WHERE TO_DATE("TransactionDate", 'YYYY-MM-DD') >= DATE '{yesterday}'
-    AND "SKU"::bigint>=100 AND "PRO5_ProductId"::numeric != 0.0;
-    """)
-    print("Query #2 Done")
-    # cursor.execute(f"""
-    # INSERT INTO "StoreSalesUnkUPC_2024_to_Q1_2025" (
-    # "Sales_Date", "Store", "PRO5_ProductId",
-    # "Qty_Sold", "Total_Sold", "Weight_Sold"
-    # )
-    # SELECT
-    # "TransactionDate", "LocationId"::bigint, "PRO5_ProductId"::numeric,
-    # "QtySold"::numeric, "TotalSold"::numeric, "WeightSold"::numeric
-    # FROM "DailyTotals_Products_By_SKU"
-    # WHERE TO_DATE("TransactionDate", 'YYYY-MM-DD') >= DATE '{yesterday}' AND "SKU"::bigint>=100 AND "PRO5_ProductId"::numeric = 0.0;
-    # """)
-    cursor.execute(f"""
-    INSERT INTO "StoreSalesUnkUPC_2024_to_Q1_2025" (
-    "Sales_Date", "Store", "PRO5_ProductId",
-    "Qty_Sold", "Total_Sold", "Weight_Sold"
-    )
-    SELECT
-    "TransactionDate", "LocationId"::bigint, "PRO5_ProductId"::numeric,
-    "QtySold"::numeric, "TotalSold"::numeric, "WeightSold"::numeric
-    FROM "DailyTotals_Products_By_SKU"
-    WHERE TO_DATE("TransactionDate", 'YYYY-MM-DD') >= DATE '{yesterday}'
-    AND "SKU"::bigint>=100 AND "PRO5_ProductId"::numeric = 0.0;
-    """)
-    print("Query #3 Done")
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+        cursor.close()
     return "Successfully Updated BI Tables!"
 
-def updateMetabaseTables():
-    import psycopg2
-
-    user = os.getenv("PG_USER")
-    password = os.getenv("PG_PASSWORD")
-    host = os.getenv("PG_HOST")
-    port = os.getenv("PG_PORT", 5432)
-    database = os.getenv("PG_DB")
-
-    conn = psycopg2.connect(
-        dbname=database, user=user, password=password, host=host, port=port
-    )
-    cursor = conn.cursor()
-
-    yesterday = date.today() - timedelta(days=1)
-
-    cursor.execute(f"""
-    INSERT INTO "StoreSales"
-    SELECT
-        "Sales_Date",
-        "Store",
-        "SBO_ProductId",
-        "PRO5_ProductId",
-        "SKU",
-        "Prod_Brand",
-        "Prod_Descr",
-        "Prod_PackSize",
-        "ItemGroup",
-        "Department",
-        "SubDepartment",
-        "POSDepartment",
-        "Qty_Sold",
-        "Total_Sold",
-        "Weight_Sold",
-        'StoreSalesByUPC' AS "Source"
-    FROM "StoreSalesByUPC_2024_to_Q1_2025"
-    WHERE "Sales_Date"::date >= DATE '{yesterday}';
-    """)
-    print("Query #1 Done")
-    cursor.execute(f"""
-    INSERT INTO "StoreSales" (
-    "Sales_Date",
-    "Store",
-    "SBO_ProductId",
-    "PRO5_ProductId",
-    "SKU",
-    "Prod_Brand",
-    "Prod_Descr",
-    "Prod_PackSize",
-    "ItemGroup",
-    "Department",
-    "SubDepartment",
-    "POSDepartment",
-    "Qty_Sold",
-    "Total_Sold",
-    "Weight_Sold",
-    "Source"
-    )
-    SELECT
-    "Sales_Date",
-    "Store",
-    0 AS "SBO_ProductId",
-    0 AS "PRO5_ProductId",
-    "SKU",
-    NULL AS "Prod_Brand",
-    NULL AS "Prod_Descr",
-    NULL AS "Prod_PackSize",
-    NULL AS "Item Group",
-    NULL AS "Department",
-    NULL AS "SubDepartment",
-    NULL AS "POSDepartment",
-    "Qty_Sold",
-    "Total_Sold",
-    "Weight_Sold",
-    'StoreSaleByDept' as "Source"
-    FROM "StoreSaleByDept_2024_to_Q1_2025"
-    WHERE "Sales_Date"::date >= DATE '{yesterday}';
-    """)
-    print("Query #2 Done")
-    cursor.execute(f"""
-        INSERT INTO "StoreSales" (
-    "Sales_Date",
-    "Store",
-    "SBO_ProductId",
-    "PRO5_ProductId",
-    "SKU",
-    "Prod_Brand",
-    "Prod_Descr",
-    "Prod_PackSize",
-    "ItemGroup",
-    "Department",
-    "SubDepartment",
-    "POSDepartment",
-    "Qty_Sold",
-    "Total_Sold",
-    "Weight_Sold",
-        "Source"
-    )
-    SELECT
-    "Sales_Date",
-    "Store",
-    0 AS "SBO_ProductId",
-    0 AS "PRO5_ProductId",
-    "SKU",
-    NULL AS "Prod_Brand",
-    NULL AS "Prod_Descr",
-    NULL AS "Prod_PackSize",
-    NULL AS "Item Group",
-    NULL AS "Department",
-    NULL AS "SubDepartment",
-    NULL AS "POSDepartment",
-    "Qty_Sold",
-    "Total_Sold",
-    "Weight_Sold",
-    'StoreSalesUnkUPC' as "Source"
-    FROM "StoreSalesUnkUPC_2024_to_Q1_2025"
-    WHERE TO_DATE("Sales_Date", 'YYYY-MM-DD') >= DATE '{yesterday}';
-    """)
-    print("Query #3 Done")
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return "Successfully Updated Metabase Tables!"
-
-
-
-def remove_csv_file(file_path):
+
+def updateMetabaseTables(start, end):
+    """
+    Replace the StoreSales day slices in [start, end] that changed in the BI tables.
+    """
+    report = refresh_store_sales(start, end)
+    touched = sum(counts['inserted'] for counts in report.values())
+    return f"Successfully Updated Metabase Tables! ({touched} rows refreshed)"
+
+
+def remove_staged_file(file_path):
     """
-    Removes a .csv file at the given file_path.
+    Removes a .csv or .parquet staging file at the given file_path.
 
     Args:
-        file_path (str): Full path to the .csv file.
+        file_path (str): Full path to the staging file.
     """
-    if file_path.endswith('.csv'):
+    if file_path.endswith(('.csv', '.parquet')):
         if os.path.exists(file_path):
             os.remove(file_path)
             print(f"File removed: {file_path}")
         else:
             print(f"File not found: {file_path}")
     else:
-        print("The specified file is not a .csv file.")
+        print("The specified file is not a .csv or .parquet file.")
 
 
-def main(tables):
+def reporting_window(etl, table='DailyTotals_Products_By_SKU'):
+    """
+    Return the (start, end) days extracted from `table` in this run, or None
+    when the extraction found no new rows (so reruns are harmless) or the load
+    did not commit (so the reporting tables are never refilled from stale data).
+    """
+    if table not in etl.loaded:
+        error = etl.load_errors.get(table, 'not loaded in this run')
+        print(f"❌ {table} was not loaded ({error}) — skipping BI/Metabase refresh.")
+        return None
+
+    window = etl.extract_windows.get(table)
+    if not window or not window['rows']:
+        print(f"ℹ️ No new rows extracted from {table} — skipping BI/Metabase refresh.")
+        return None
+
+    # Watermark values may be dates or timestamps; the refresh works on whole days
+    start, end = str(window['low'])[:10], str(window['high'])[:10]
+    print(f"📅 Refreshing reporting tables for {start} → {end}")
+    return start, end
+
+
+def reporting_steps(window_step, table='DailyTotals_Products_By_SKU', prefix='', etl=None):
+    """
+    DAG steps that refresh the BI tables, StoreSales and the rollups for the
+    window returned by step `window_step`, with each table's maintenance
+    (indexes, BRIN, ANALYZE) starting as soon as that table's writes are done.
+
+    With `etl` (whose watermarks are deferred), a last step advances `table`'s
+    watermark once every refresh committed. If any of them fails, the next run
+    extracts the same days again, so they still reach the reporting tables
+    (the staging table only ever holds the latest extraction).
+    """
+    def windowed(func):
+        # Steps receive the window first, then the results of their other deps
+        return lambda window, *_: func(*window) if window else None
+
+    def name(step):
+        return f"{prefix}{step}"
+
+    bi_tables = [bi_table for bi_table, _ in BI_ROUTES.values()]
+    steps = [
+        Step(name('maintain_source'), windowed(lambda s, e: run_maintenance([table], s, e)), [window_step]),
+        Step(name('bi_tables'), windowed(updateBITables), [window_step], retries=STEP_RETRIES),
+        Step(name('maintain_bi'), windowed(lambda s, e: run_maintenance(bi_tables, s, e)),
+             [window_step, name('bi_tables')]),
+        Step(name('store_sales'), windowed(updateMetabaseTables), [window_step, name('bi_tables')],
+             retries=STEP_RETRIES),
+        Step(name('maintain_store_sales'), windowed(lambda s, e: run_maintenance(["StoreSales"], s, e)),
+             [window_step, name('store_sales')]),
+    ]
+    for rollup in ROLLUPS:
+        steps.append(Step(name(rollup), windowed(lambda s, e, r=rollup: refresh_rollups(s, e, [r])),
+                          [window_step, name('store_sales')], retries=STEP_RETRIES))
+    steps.append(Step(name('maintain_rollups'), windowed(lambda s, e: run_maintenance(list(ROLLUPS), s, e)),
+                      [window_step, *[name(rollup) for rollup in ROLLUPS]]))
+    if etl is not None:
+        steps.append(Step(name('watermark'), windowed(lambda s, e: etl.commit_watermark(table)),
+                          [window_step, name('bi_tables'), name('store_sales'), *[name(rollup) for rollup in ROLLUPS]]))
+    # Refresh steps are bounded; extraction/load steps run as long as they need
+    for step in steps:
+        step.timeout = STEP_TIMEOUT
+    return steps
+
+
+def refresh_reporting_tables(etl, table='DailyTotals_Products_By_SKU'):
+    """
+    Refresh the BI and Metabase tables for exactly the days extracted in this run.
+    """
+    steps = [Step('window', lambda: reporting_window(etl, table))] + reporting_steps('window', table, etl=etl)
+    return run_dag(steps, max_workers=DAG_WORKERS)
+
+
+def pipeline_steps(tables, prefix=''):
+    """
+    The whole POS job as DAG steps: extract/transform/load (or stream), then
+    the reporting refresh; staged files are removed as soon as they are loaded.
+    """
     etl = ETL()
+    # Watermarks only move once the reporting refresh succeeded (see reporting_steps)
+    etl.defer_watermarks = True
 
+    def name(step):
+        return f"{prefix}{step}"
 
     # Choose your source and target
     source_server = 'sqlserver'   # or 'postgres'
     target_server = 'postgres'    # or extend to 'sqlserver' if implemented
 
-    # Step 1: Extract data from the source DB
-    extracted_data = etl.extract(tables=tables, source=source_server, output_dir='./exported_tables')
-
-    # Step 2: Transform the extracted data
-    transformed_data = etl.transform(extracted_data)
+    def finish(*_):
+        etl.close()
+        return reporting_window(etl)
+
+    def stream_pending():
+        # stream() reports failures per table; raise so the DAG retries just those tables
+        etl.stream(tables=[table for table in tables if table not in etl.loaded],
+                   source=source_server, target=target_server)
+        if etl.load_errors:
+            raise RuntimeError(f"failed to stream {', '.join(etl.load_errors)}")
+
+    if use_streaming:
+        # Extract, transform and load chunk by chunk
+        steps = [
+            Step(name('stream'), stream_pending, retries=STEP_RETRIES),
+            Step(name('window'), finish, [name('stream')]),
+        ]
+    else:
+        steps = [
+            Step(name('extract'), lambda: etl.extract(tables=tables, source=source_server,
+                                                      output_dir='./exported_tables')),
+            Step(name('transform'), etl.transform, [name('extract')]),
+            Step(name('load'), lambda data: etl.load(data, target=target_server, source=source_server),
+                 [name('transform')]),
+            Step(name('remove_staged'), lambda _: [
+                remove_staged_file(etl.staged_path(table, source=source_server, output_dir='./exported_tables'))
+                for table in tables
+            ], [name('load')]),
+            Step(name('window'), finish, [name('load'), name('remove_staged')]),
+        ]
+    return steps + reporting_steps(name('window'), prefix=prefix, etl=etl)
 
-    # # Step 3: Load the transformed data into the target DB
 
-    etl.close()
-    etl.load(transformed_data, target=target_server)
-    updateBITables()
-    updateMetabaseTables()
-    remove_csv_file('exported_tables/db_mrspecialdw_DailyTotals_Products_By_SKU.csv')
-    
+def main(tables):
+    try:
+        run_dag(pipeline_steps(tables), max_workers=DAG_WORKERS)
+    finally:
+        close_pg_pool()
 
-    # # Step 4: Close both connections
 
 if __name__ == '__main__':
     # tables_with_nulls = get_tables_with_nulls(tables_to_extract)
@@ -0,0 +1,53 @@
+import sys
+import os
+import argparse
+from dotenv import load_dotenv
+
+# Load .env before the tools read their settings from the environment
+load_dotenv()
+
+# Add parent directory to import path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tools.conn import pg_connection, close_pg_pool
+from tools.pgpartitions import SALES_TABLES, PARTITION_INTERVAL, INTERVAL_MONTHS, is_partitioned, table_exists, \
+    migrate_to_partitioned
+
+# One-off conversion of the sales tables to Sales_Date range partitioning.
+#
+# The daily refresh only adds partitions to tables that are already
+# partitioned; this command does the conversion itself. Each table is rebuilt
+# in its own transaction and stays locked (reads included) until its rows have
+# been copied, so run it outside the refresh schedule.
+#
+# Usage:
+#   python pos/migrate_partitions.py                 # every table in SALES_TABLES
+#   python pos/migrate_partitions.py StoreSales      # specific tables
+
+
+def migrate(tables, interval=PARTITION_INTERVAL):
+    """
+    Convert each plain table in `tables` (skipping missing and already
+    partitioned ones), committing one table at a time.
+    """
+    for table in tables:
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                if not table_exists(cur, table):
+                    print(f"⚠️ Table \"{table}\" does not exist — skipping.")
+                elif is_partitioned(cur, table):
+                    print(f"ℹ️ \"{table}\" is already partitioned — skipping.")
+                else:
+                    migrate_to_partitioned(cur, table, interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert sales tables to Sales_Date range partitioning.")
+    parser.add_argument('tables', nargs='*', default=SALES_TABLES, help="tables to convert (default: SALES_TABLES)")
+    parser.add_argument('--interval', default=PARTITION_INTERVAL, choices=list(INTERVAL_MONTHS),
+                        help="partition size (default: PG_PARTITION_INTERVAL)")
+    args = parser.parse_args()
+
+    try:
+        migrate(args.tables, args.interval)
+    finally:
+        close_pg_pool()
@@ -0,0 +1,46 @@
+import os
+import sys
+import importlib.util
+from dotenv import load_dotenv
+
+# Load .env before the tools read their settings from the environment
+load_dotenv()
+
+# Add this directory to import path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from tools.conn import close_pg_pool
+from tools.dag import Step, run_dag
+
+# Runs the POS and PMR jobs as one DAG: the PMR download/merge runs alongside
+# the POS extract/load and reporting refresh instead of after it.
+
+DAG_WORKERS = int(os.getenv('ETL_DAG_WORKERS', 6))
+PMR_RETRIES = int(os.getenv('PMR_RETRIES', 2))
+
+
+def load_job(name):
+    """
+    Import <name>/main.py (the job folders are not packages, and all use main.py).
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name, 'main.py')
+    spec = importlib.util.spec_from_file_location(f"{name}_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    pos = load_job('pos')
+    pmr = load_job('pmr')
+
+    steps = pos.pipeline_steps(pos.tables_to_extract, prefix='pos.')
+    steps.append(Step('pmr.load', pmr.main, retries=PMR_RETRIES, retry_delay=30))
+    try:
+        run_dag(steps, max_workers=DAG_WORKERS)
+    finally:
+        close_pg_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+-- Daily sales per store and department, as shown on the Metabase sales dashboard.
+-- Params: start, end (ISO dates, inclusive)
+SELECT "period" AS "Sales_Date", "Store", "Department",
+       "Qty_Sold", "Total_Sold", "Weight_Sold"
+FROM "rollup_daily_store_department"
+WHERE "period" BETWEEN %(start)s AND %(end)s
+ORDER BY "period", "Store", "Department"
@@ -0,0 +1,7 @@
+-- Item-level drill-down on StoreSales for one window (prunes to the window's partitions).
+-- Params: start, after (ISO dates, half-open)
+SELECT "Sales_Date", "Store", "SKU", "Prod_Descr",
+       sum("Qty_Sold") AS "Qty_Sold", sum("Total_Sold") AS "Total_Sold"
+FROM "StoreSales"
+WHERE "Sales_Date" >= %(start)s AND "Sales_Date" < %(after)s
+GROUP BY "Sales_Date", "Store", "SKU", "Prod_Descr"
@@ -0,0 +1,7 @@
+-- Weekly sales per brand, as shown on the Metabase brand dashboard.
+-- Params: start, end (ISO dates, inclusive; weeks starting in the window)
+SELECT "period" AS "Week", "Prod_Brand",
+       "Qty_Sold", "Total_Sold", "Weight_Sold"
+FROM "rollup_weekly_brand"
+WHERE "period" BETWEEN date_trunc('week', %(start)s::date)::date AND %(end)s
+ORDER BY "period", "Total_Sold" DESC
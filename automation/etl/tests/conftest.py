@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The ETL modules import each other as top-level packages (tools.*, etl)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from tools import conn
+
+
+class FakeConnection:
+    closed = False
+    autocommit = False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FlakyPool:
+    """
+    A pool whose first `failures` getconn() calls raise.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.returned = []
+
+    def getconn(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("could not connect")
+        return FakeConnection()
+
+    def putconn(self, connection, close=False):
+        self.returned.append(connection)
+
+
+def borrow():
+    with conn.pg_connection() as connection:
+        return connection
+
+
+def test_failed_connects_release_their_slot(monkeypatch):
+    pool = FlakyPool(conn.PG_POOL_MAX + 1)
+    monkeypatch.setattr(conn, 'get_pg_pool', lambda: pool)
+    monkeypatch.setattr(conn, '_is_healthy', lambda connection: True)
+
+    for _ in range(conn.PG_POOL_MAX + 1):
+        with pytest.raises(ConnectionError):
+            borrow()
+
+    # With leaked slots this call would block forever
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(connection=borrow()), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive(), "pg_connection() blocked after failed connects"
+    assert pool.returned == [result['connection']]
+
+
+def test_failed_reconnect_releases_its_slot(monkeypatch):
+    class StalePool(FlakyPool):
+        def getconn(self):
+            if self.returned:
+                raise ConnectionError("could not reconnect")
+            return FakeConnection()
+
+    pool = StalePool(0)
+    monkeypatch.setattr(conn, 'get_pg_pool', lambda: pool)
+    monkeypatch.setattr(conn, '_is_healthy', lambda connection: False)
+
+    for _ in range(conn.PG_POOL_MAX + 1):
+        pool.returned = []
+        with pytest.raises(ConnectionError):
+            borrow()
+        # Only the stale connection went back; nothing was put back twice
+        assert len(pool.returned) == 1
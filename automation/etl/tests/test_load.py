@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from tools import load
+
+
+class RecordingCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+
+class RecordingConnection:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def cursor(self):
+        return RecordingCursor(self.statements)
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """
+    Run the loader against a fake connection, recording every statement and
+    failing the test if a shadow table is swapped in.
+    """
+    statements = []
+
+    @contextmanager
+    def fake_connection():
+        yield RecordingConnection(statements)
+
+    def no_swap(table_name, after_swap=None):
+        pytest.fail(f"empty shadow swapped into {table_name}")
+
+    monkeypatch.setattr(load, 'pg_connection', fake_connection)
+    monkeypatch.setattr(load, 'swap_shadow', no_swap)
+    return statements
+
+
+def empty_chunks():
+    return [pd.DataFrame({'Store': pd.Series([], dtype='int64')}) for _ in range(2)]
+
+
+def test_stream_swap_of_empty_chunks_keeps_live_table(statements):
+    assert load.load_stream_to_postgres(empty_chunks(), 'Sales', if_exists='swap', workers=1) == 0
+    assert statements[-1] == 'DROP TABLE "Sales__shadow"'
+
+
+def test_parallel_swap_of_empty_chunks_keeps_live_table(statements, monkeypatch):
+    monkeypatch.setattr(load, 'parallel_copy', lambda chunks, stage, types, workers: [{'rows': 0}])
+
+    assert load.load_stream_to_postgres(empty_chunks(), 'Sales', if_exists='swap', workers=2) == 0
+    assert statements[-1] == 'DROP TABLE "Sales__shadow"'
+    assert not any('SET LOGGED' in sql for sql in statements)
@@ -0,0 +1,47 @@
+import gzip
+
+import pytest
+
+from tools.pmr import PMR_COLUMNS, PmrParser
+from tools.pmrshelf import SHELF_KEYS
+
+
+def export(tmp_path, rows):
+    path = tmp_path / "export.csv.gz"
+    with gzip.open(path, 'wt') as f:
+        f.write(','.join(PMR_COLUMNS) + '\n')
+        f.writelines(','.join(row) + '\n' for row in rows)
+    return str(path)
+
+
+def observation(id, outlet='O1', product='P1'):
+    return [id, '2025-01-02', '10:00', product, 'cat', 'brand', 'upc', 'cc', 'product', outlet, 'outlet',
+            'chain', '2', '5', 'N', 'Y', '19.99', '']
+
+
+@pytest.fixture(params=['_arrow_batches', '_pandas_batches'])
+def batches(request):
+    if request.param == '_arrow_batches':
+        pytest.importorskip('pyarrow')
+    return request.param
+
+
+def test_blank_codes_are_quarantined_for_the_shelf(tmp_path, batches):
+    path = export(tmp_path, [observation('1'), observation('2', outlet=''), observation('3', product='  ')])
+    parser = PmrParser(path, required=SHELF_KEYS)
+
+    loaded = list(getattr(parser, batches)())
+
+    assert [id for df in loaded for id in df['id']] == ['1']
+    assert [reason for _, reason, _ in parser.rejected] == ['missing outletCode', 'missing productCode']
+    assert parser.counts['bad_values'] == 2
+
+
+def test_blank_codes_are_kept_without_required_columns(tmp_path, batches):
+    path = export(tmp_path, [observation('1'), observation('2', outlet='')])
+    parser = PmrParser(path)
+
+    loaded = list(getattr(parser, batches)())
+
+    assert sum(len(df) for df in loaded) == 2
+    assert parser.rejected == []
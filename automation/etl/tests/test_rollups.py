@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from tools import rollups
+
+
+class TotalsCursor:
+    """
+    Returns the rollup totals for the first query and the base totals for the second.
+    """
+
+    def __init__(self, rollup, base):
+        self.results = [rollup, base]
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+
+def check(rollup, base):
+    spec = rollups.ROLLUPS["rollup_daily_store_department"]
+    cur = TotalsCursor(rollup, base)
+    return rollups.check_rollup(cur, "rollup_daily_store_department", spec, '2024-01-01', '2024-01-07')
+
+
+def test_float_rounding_is_not_a_mismatch():
+    summed = sum([0.1] * 10)
+    assert summed != 1.0
+    assert check((summed, Decimal('1.00'), 2.5, 10), (1.0, Decimal('1.00'), 2.5, 10)) == []
+
+
+def test_real_differences_are_reported():
+    mismatches = check((10.0, 5.0, None, 9), (10.0, 5.5, 0, 10))
+    assert mismatches == [("Total_Sold", 5.0, 5.5), ("row_count", 9, 10)]
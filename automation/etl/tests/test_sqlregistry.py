@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+from tools import sqlregistry
+
+
+class FakeConnection:
+    def __init__(self, backend_pid):
+        self.info = SimpleNamespace(backend_pid=backend_pid)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+
+def test_prepares_again_on_a_new_connection_with_a_reused_pid():
+    sqlregistry.register('test_prepared', 'SELECT %(a)s')
+    first, second = FakeCursor(FakeConnection(42)), FakeCursor(FakeConnection(42))
+
+    sqlregistry.execute(first, 'test_prepared', {'a': 1}, prepare=True)
+    sqlregistry.execute(first, 'test_prepared', {'a': 2}, prepare=True)
+    sqlregistry.execute(second, 'test_prepared', {'a': 3}, prepare=True)
+
+    assert [sql.split()[0] for sql in first.statements] == ['PREPARE', 'EXECUTE', 'EXECUTE']
+    assert [sql.split()[0] for sql in second.statements] == ['PREPARE', 'EXECUTE']
@@ -0,0 +1,15 @@
+import pandas as pd
+
+from tools.transform import drop_seen_duplicates
+
+
+def test_drops_duplicates_across_chunks():
+    chunks = [
+        pd.DataFrame({'sku': [1, 2, 2], 'qty': [1.0, None, None]}),
+        pd.DataFrame({'sku': [2, 3, 1], 'qty': [None, 3.0, 1.0]}, index=[3, 4, 5]),
+    ]
+    seen = set()
+
+    streamed = pd.concat([drop_seen_duplicates(chunk, seen) for chunk in chunks])
+
+    assert streamed.equals(pd.concat(chunks).drop_duplicates())
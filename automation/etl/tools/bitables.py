@@ -0,0 +1,75 @@
+from tools.sqlregistry import register
+
+# The BI tables fed from DailyTotals_Products_By_SKU, and the statements that
+# refresh them, registered in tools.sqlregistry by name:
+#   bi_fan_out                 insert the [start, end] window into every BI table
+#   bi_delete_window_<route>   clear [start, after) from one BI table
+
+# Where each DailyTotals row goes: route → (BI table, {BI column: DailyTotals column}).
+# A row is classified once, by BI_ROUTE_SQL; rows matching no route
+# (SKU < 100 with a PRO5 id) are not copied anywhere, as before.
+BI_ROUTES = {
+    'dept': ("StoreSaleByDept_2024_to_Q1_2025", {
+        "Sales_Date": "TransactionDate", "Store": "LocationId", "SKU": "SKU",
+        "Qty_Sold": "QtySold", "Total_Sold": "TotalSold", "Weight_Sold": "WeightSold",
+        "PRO5_ProductId": "PRO5_ProductId",
+    }),
+    'upc': ("StoreSalesByUPC_2024_to_Q1_2025", {
+        "Sales_Date": "TransactionDate", "Store": "LocationId", "SBO_ProductId": "SBO_ProductId",
+        "PRO5_ProductId": "PRO5_ProductId", "SKU": "SKU",
+        "Prod_Brand": "Brand", "Prod_Descr": "Description", "Prod_PackSize": "PackSize", "ItemGroup": "ItemGroup",
+        "Department": "Department", "SubDepartment": "SubDepartment", "POSDepartment": "POSDepartment",
+        "Qty_Sold": "QtySold", "Total_Sold": "TotalSold", "Weight_Sold": "WeightSold",
+    }),
+    'unk': ("StoreSalesUnkUPC_2024_to_Q1_2025", {
+        "Sales_Date": "TransactionDate", "Store": "LocationId", "PRO5_ProductId": "PRO5_ProductId",
+        "Qty_Sold": "QtySold", "Total_Sold": "TotalSold", "Weight_Sold": "WeightSold",
+    }),
+}
+
+BI_ROUTE_SQL = """
+    CASE
+        WHEN "SKU" < 100 AND "PRO5_ProductId" = 0 THEN 'dept'
+        WHEN "SKU" >= 100 AND "PRO5_ProductId" != 0 THEN 'upc'
+        WHEN "SKU" >= 100 AND "PRO5_ProductId" = 0 THEN 'unk'
+    END
+"""
+
+
+def fan_out_bi_sql(source_table="DailyTotals_Products_By_SKU"):
+    """
+    Build one statement that reads the [%(start)s, %(end)s] window of `source_table`
+    once, classifies every row with BI_ROUTE_SQL and inserts it into its BI table.
+
+    The source CTE is MATERIALIZED so the three INSERT branches share a single scan,
+    and the statement returns one (route, rows inserted) pair per route.
+    """
+    source_columns = sorted({col for _, mapping in BI_ROUTES.values() for col in mapping.values()})
+    branches, counts = [], []
+    for route, (bi_table, mapping) in BI_ROUTES.items():
+        targets = ', '.join([f'"{col}"' for col in mapping])
+        values = ', '.join([f'"{col}"' for col in mapping.values()])
+        branches.append(f"""
+    ins_{route} AS (
+        INSERT INTO "{bi_table}" ({targets})
+        SELECT {values} FROM routed WHERE route = '{route}'
+        RETURNING 1
+    )""")
+        counts.append(f"SELECT '{route}', count(*) FROM ins_{route}")
+
+    return f"""
+    WITH routed AS MATERIALIZED (
+        SELECT {', '.join([f'"{col}"' for col in source_columns])}, {BI_ROUTE_SQL.strip()} AS route
+        FROM "{source_table}"
+        WHERE "TransactionDate" BETWEEN %(start)s::date AND %(end)s::date
+    ),{','.join(branches)}
+    {' UNION ALL '.join(counts)}
+    """
+
+
+register("bi_fan_out", fan_out_bi_sql())
+for _route, (_bi_table, _) in BI_ROUTES.items():
+    register(f"bi_delete_window_{_route}", f"""
+        DELETE FROM "{_bi_table}"
+        WHERE "Sales_Date" >= %(start)s AND "Sales_Date" < %(after)s
+    """)
@@ -1,19 +1,62 @@
 import os
-import pyodbc
-import psycopg2
-from dotenv import load_dotenv
+import urllib.parse
+import time
+import threading
+from contextlib import contextmanager
 
-# Load .env variables
-load_dotenv()
+# psycopg2 and python-dotenv are imported on first use, so importing this
+# module (and everything built on it) stays cheap. Entry points load .env
+# before importing the tools, since settings are read from the environment
+# at import time; load_env() is also called before every connection.
+
+# Session settings applied once to every pooled PostgreSQL connection
+PG_SESSION_SETTINGS = {
+    'work_mem': os.getenv('PG_WORK_MEM', '64MB'),
+    'statement_timeout': os.getenv('PG_STATEMENT_TIMEOUT', '0'),
+}
+# Opt-in: PG_SYNCHRONOUS_COMMIT=off speeds up commits, but a server crash can
+# lose the last commits; by default the server's durable setting is kept
+if os.getenv('PG_SYNCHRONOUS_COMMIT'):
+    PG_SESSION_SETTINGS['synchronous_commit'] = os.getenv('PG_SYNCHRONOUS_COMMIT')
+PG_POOL_MAX = int(os.getenv('PG_POOL_MAX', 8))
+# Connections idle longer than this are pinged before being handed out
+PG_POOL_PING_AFTER = float(os.getenv('PG_POOL_PING_AFTER', 30))
+
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+_pg_pool_slots = threading.BoundedSemaphore(PG_POOL_MAX)
+_pg_last_used = {}
+_env_loaded = False
+
+
+def load_env():
+    """
+    Load .env variables into the environment (once).
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
 
-from sqlalchemy import create_engine
-import urllib
-import os
 
-def get_sqlserver_connection():
+def pg_session_options(settings=None):
+    """
+    Render session settings as a libpq `options` string (-c name=value ...).
+    """
+    settings = PG_SESSION_SETTINGS if settings is None else settings
+    return ' '.join([f"-c {name}={value}" for name, value in settings.items()])
+
+def get_sqlserver_connection(pool_size=5):
     """
     Returns a SQLAlchemy engine connected to SQL Server.
+    `pool_size` should cover the number of concurrent extraction workers.
     """
+    # SQLAlchemy (and the pyodbc dialect it loads) is only imported by jobs that need an engine
+    from sqlalchemy import create_engine
+
+    load_env()
     creds = {
         'server': os.getenv('SQLSERVER_SERVER'),
         'database': "db_mrspecialdw",
@@ -33,7 +76,7 @@ def get_sqlserver_connection():
     )
 
     try:
-        engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
+        engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}", pool_size=pool_size, pool_pre_ping=True)
         print(f"✅ Connected to SQL Server: {creds['server']}\\{creds['database']}")
         return engine, creds
     except Exception as e:
@@ -41,12 +84,14 @@ def get_sqlserver_connection():
         raise
 
 
-def get_postgres_connection():
+def get_postgres_connection(pool_size=5):
     """
     Returns a SQLAlchemy engine connected to PostgreSQL.
+    `pool_size` should cover the number of concurrent extraction workers.
     """
-    import os
+    from sqlalchemy import create_engine
 
+    load_env()
     user = os.getenv("PG_USER")
     password = os.getenv("PG_PASSWORD")
     host = os.getenv("PG_HOST")
@@ -54,7 +99,8 @@ def get_postgres_connection():
     database = "mrspecial_pos_db"
 
     try:
-        engine = create_engine(f'postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}')
+        engine = create_engine(f'postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}', pool_size=pool_size,
+                               pool_pre_ping=True, connect_args={'options': pg_session_options()})
         print(f"✅ Connected to PostgreSQL: {host}:{port}/{database}")
         return engine, {
             "user": user,
@@ -64,4 +110,93 @@ def get_postgres_connection():
         }
     except Exception as e:
         print(f"❌ PostgreSQL connection failed: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def get_pg_pool():
+    """
+    Return the process-wide psycopg2 connection pool for PG_DB, creating it on first use.
+    """
+    from psycopg2 import pool as pg_pool
+
+    global _pg_pool
+    with _pg_pool_lock:
+        if _pg_pool is None or _pg_pool.closed:
+            load_env()
+            _pg_pool = pg_pool.ThreadedConnectionPool(
+                1, PG_POOL_MAX,
+                dbname=os.getenv("PG_DB"),
+                user=os.getenv("PG_USER"),
+                password=os.getenv("PG_PASSWORD"),
+                host=os.getenv("PG_HOST"),
+                port=os.getenv("PG_PORT", 5432),
+                options=pg_session_options(),
+            )
+            print(f"✅ PostgreSQL pool ready: {os.getenv('PG_HOST')}/{os.getenv('PG_DB')} (max {PG_POOL_MAX})")
+        return _pg_pool
+
+
+def _is_healthy(conn):
+    from psycopg2 import extensions as pg_extensions
+
+    if conn.closed or conn.info.transaction_status == pg_extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _pg_last_used.get(id(conn), 0) < PG_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+@contextmanager
+def pg_connection(autocommit=False):
+    """
+    Borrow a pooled PostgreSQL connection.
+
+    Blocks while all PG_POOL_MAX connections are in use. Unless `autocommit`
+    is set, the work done with the connection is committed on success and
+    rolled back on error; either way the connection goes back to the pool.
+    A failed connection attempt raises and frees its slot.
+    """
+    _pg_pool_slots.acquire()
+    pool, conn = None, None
+    try:
+        pool = get_pg_pool()
+        conn = pool.getconn()
+        if not _is_healthy(conn):
+            stale, conn = conn, None
+            pool.putconn(stale, close=True)
+            conn = pool.getconn()
+        conn.autocommit = autocommit
+        try:
+            yield conn
+            if not autocommit:
+                conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    finally:
+        try:
+            if conn is not None:
+                _pg_last_used[id(conn)] = time.monotonic()
+                if not conn.closed:
+                    conn.autocommit = False
+                pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            _pg_pool_slots.release()
+
+
+def close_pg_pool():
+    """
+    Close every pooled PostgreSQL connection.
+    """
+    global _pg_pool
+    with _pg_pool_lock:
+        if _pg_pool is not None and not _pg_pool.closed:
+            _pg_pool.closeall()
+        _pg_pool = None
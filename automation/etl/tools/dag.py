@@ -0,0 +1,209 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# A small DAG runner for pipeline steps.
+#
+# Each Step names the steps it depends on; it starts as soon as all of them
+# have succeeded and receives their results as positional arguments, in the
+# order of `deps`. Independent steps run concurrently on a thread pool.
+#
+# - retries: a step that raises is re-run up to `retries` more times, no sooner
+#   than `retry_delay` seconds later. The wait never blocks the scheduler, so
+#   other steps keep starting and finishing meanwhile.
+# - timeout: a step still running after `timeout` seconds is failed. Python
+#   threads can't be killed, so the attempt is abandoned (not retried) and
+#   keeps running in the background until it returns.
+# A failed step skips everything downstream of it; the rest of the DAG runs.
+#
+# run_dag() prints a timing report with the critical path: the chain of
+# dependent steps that determined the total wall time.
+
+
+class Step:
+    """
+    One node of the DAG: `func(*results of deps)`.
+    """
+
+    def __init__(self, name, func, deps=(), timeout=None, retries=0, retry_delay=5):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def __repr__(self):
+        return f"Step({self.name!r}, deps={self.deps})"
+
+
+class StepFailed(Exception):
+    pass
+
+
+def _check(steps):
+    by_name = {}
+    for step in steps:
+        if step.name in by_name:
+            raise ValueError(f"Duplicate step name '{step.name}'")
+        by_name[step.name] = step
+    for step in steps:
+        missing = [dep for dep in step.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Step '{step.name}' depends on unknown steps {missing}")
+
+    # Kahn's algorithm, only to reject cycles up front
+    pending = {step.name: set(step.deps) for step in steps}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between steps {sorted(pending)}")
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return by_name
+
+
+def critical_path(steps, timings):
+    """
+    Return the names on the critical path: starting from the step that finished
+    last, repeatedly follow the dependency that finished last.
+    """
+    by_name = {step.name: step for step in steps}
+    finished = {name: t for name, t in timings.items() if t.get('end') is not None}
+    if not finished:
+        return []
+    path = [max(finished, key=lambda name: finished[name]['end'])]
+    while True:
+        deps = [dep for dep in by_name[path[-1]].deps if dep in finished]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda dep: finished[dep]['end']))
+    return path[::-1]
+
+
+def print_report(steps, timings, wall):
+    """
+    Print per-step status and timings, and the critical path.
+    """
+    print("\n📋 Pipeline report")
+    for step in steps:
+        t = timings.get(step.name, {})
+        duration = f"{t['end'] - t['start']:8.2f}s" if t.get('end') is not None else " " * 9
+        attempts = f" ({t['attempts']} attempts)" if t.get('attempts', 1) > 1 else ''
+        print(f"  {t.get('status', 'skipped'):9} {duration}  {step.name}{attempts}")
+
+    path = critical_path(steps, timings)
+    if path:
+        busy = sum(t['end'] - t['start'] for t in timings.values() if t.get('end') is not None)
+        chain = ' → '.join([f"{name} ({timings[name]['end'] - timings[name]['start']:.1f}s)" for name in path])
+        print(f"⏱️ Wall time {wall:.1f}s for {busy:.1f}s of work (parallelism {busy / wall if wall else 0:.1f}x)")
+        print(f"🛤️ Critical path: {chain}")
+
+
+def run_dag(steps, max_workers=4, report=True):
+    """
+    Run `steps` (a list of Step) respecting their dependencies.
+
+    Returns:
+        dict: {step name: result} for the steps that succeeded.
+
+    Raises:
+        StepFailed: if any step failed or timed out (after the rest of the DAG ran).
+    """
+    by_name = _check(steps)
+    dependents = {step.name: [] for step in steps}
+    for step in steps:
+        for dep in step.deps:
+            dependents[dep].append(step.name)
+
+    results, timings, errors = {}, {}, {}
+    waiting = {step.name: set(step.deps) for step in steps}
+    running = {}  # future → step name
+    delayed = {}  # step name → time its retry may start
+    started = time.perf_counter()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def timed(step, args):
+        timings[step.name]['start'] = time.perf_counter()
+        return step.func(*args)
+
+    def submit(name):
+        step = by_name[name]
+        timings.setdefault(name, {'attempts': 0})
+        timings[name]['attempts'] += 1
+        timings[name]['start'] = None
+        running[executor.submit(timed, step, [results[dep] for dep in step.deps])] = name
+        print(f"▶️ {name}")
+
+    def skip_downstream(name):
+        for child in dependents[name]:
+            if child in waiting:
+                del waiting[child]
+                timings[child] = {'status': 'skipped'}
+                skip_downstream(child)
+
+    try:
+        for name in [name for name, deps in waiting.items() if not deps]:
+            del waiting[name]
+            submit(name)
+
+        while running or delayed:
+            for name, at in list(delayed.items()):
+                if at <= time.perf_counter():
+                    del delayed[name]
+                    submit(name)
+            if not running:
+                time.sleep(min(1, max(0, min(delayed.values()) - time.perf_counter())))
+                continue
+
+            done, _ = wait(list(running), timeout=1, return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            for future, name in list(running.items()):
+                step, t = by_name[name], timings[name]
+                if future in done or step.timeout is None or t['start'] is None:
+                    continue
+                if now - t['start'] > step.timeout:
+                    del running[future]
+                    t.update(end=now, status='timeout')
+                    errors[name] = TimeoutError(f"timed out after {step.timeout}s")
+                    print(f"⌛ {name} timed out after {step.timeout}s — abandoning it")
+                    skip_downstream(name)
+
+            for future in done:
+                name = running.pop(future, None)
+                if name is None:
+                    continue  # finished after it was abandoned
+                step, t = by_name[name], timings[name]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if t['attempts'] <= step.retries:
+                        print(f"🔁 {name} failed ({e}); retrying in {step.retry_delay}s "
+                              f"({t['attempts']}/{step.retries})")
+                        delayed[name] = time.perf_counter() + step.retry_delay
+                        continue
+                    t.update(end=time.perf_counter(), status='failed')
+                    errors[name] = e
+                    print(f"❌ {name} failed: {e}")
+                    skip_downstream(name)
+                    continue
+
+                t.update(end=time.perf_counter(), status='ok')
+                print(f"✅ {name} ({t['end'] - t['start']:.1f}s)")
+                for child in dependents[name]:
+                    if child in waiting:
+                        waiting[child].discard(name)
+                        if not waiting[child]:
+                            del waiting[child]
+                            submit(child)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if report:
+        print_report(steps, timings, time.perf_counter() - started)
+    if errors:
+        raise StepFailed(f"{len(errors)} step(s) failed: " + ', '.join([f"{n} ({e})" for n, e in errors.items()]))
+    return results
@@ -0,0 +1,79 @@
+import os
+import sys
+import csv
+import subprocess
+from datetime import datetime
+
+# Measures how long it takes to import the ETL entry points, using Python's
+# own -X importtime instrumentation in a fresh interpreter, and appends the
+# result to a CSV log so startup regressions show up over time.
+#
+# Usage:
+#   python tools/importtime.py                # measure the default modules
+#   python tools/importtime.py etl tools.load # measure specific modules
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_MODULES = ('etl', 'tools.conn', 'tools.load', 'tools.pmr')
+IMPORT_TIME_LOG = os.getenv('IMPORT_TIME_LOG', os.path.join(ETL_DIR, 'import_times.csv'))
+
+
+def measure_import(module, top=5):
+    """
+    Import `module` in a fresh interpreter and return its import timings.
+
+    Returns:
+        dict: module, total_ms and the `top` slowest imported packages as [(name, ms)].
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ETL_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings.append((name.rstrip(), int(cumulative)))
+
+    total = next((us for name, us in timings if name.strip() == module), 0)
+    top_level = [(name.strip(), us / 1000) for name, us in timings if not name.startswith('  ')]
+    return {
+        'module': module,
+        'total_ms': total / 1000,
+        'slowest': sorted(top_level, key=lambda item: item[1], reverse=True)[:top],
+    }
+
+
+def record(results, path=IMPORT_TIME_LOG):
+    """
+    Append measured import times to the CSV log at `path`.
+    """
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['measured_at', 'python', 'module', 'total_ms'])
+        measured_at = datetime.now().isoformat(timespec='seconds')
+        for result in results:
+            writer.writerow([measured_at, sys.version.split()[0], result['module'], f"{result['total_ms']:.1f}"])
+
+
+if __name__ == "__main__":
+    results = []
+    for module in sys.argv[1:] or DEFAULT_MODULES:
+        try:
+            result = measure_import(module)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            continue
+        results.append(result)
+        slowest = ', '.join([f"{name} {ms:.0f}ms" for name, ms in result['slowest']])
+        print(f"⏱️ import {module}: {result['total_ms']:.1f} ms (slowest: {slowest})")
+
+    if results:
+        record(results)
+        print(f"📝 Import times appended to {IMPORT_TIME_LOG}")
@@ -1,40 +1,409 @@
 import os
+import re
 import time
-import pandas as pd
-import psycopg2
-from tqdm import trange
+import zlib
+import itertools
 from threading import Thread, Event
-from dotenv import load_dotenv
-from io import StringIO
-
-load_dotenv()
+from tools.conn import pg_connection
+from tools.pgcopy import copy_from_dataframe
+from tools.parallelcopy import COPY_WORKERS, iter_slices, parallel_copy
+from tools.schema import postgres_types_from_dataframe, create_table_sql, coerce_to_types, postgres_table_types
 
 def show_spinner(message, stop_event):
+    from tqdm import trange
+
     for _ in trange(9999, desc=message, leave=False, ncols=100):
         if stop_event.is_set():
             break
         time.sleep(0.1)
 
-def load_to_postgres(df, table_name, if_exists='replace'):
-    user = os.getenv("PG_USER")
-    password = os.getenv("PG_PASSWORD")
-    host = os.getenv("PG_HOST")
-    port = os.getenv("PG_PORT", 5432)
-    database = os.getenv("PG_DB")
+def copy_dataframe(cur, df, quoted_table_name, column_types=None):
+    """
+    COPY a single DataFrame into an existing table using the given cursor.
+    Uses binary COPY when `column_types` allow it, otherwise streams CSV in
+    fixed-size batches (see tools.pgcopy).
+    """
+    return copy_from_dataframe(cur, df, quoted_table_name, column_types)
+
+
+MERGE_MODES = ('merge', 'replace_partition')
+
+# 'swap' mode: load into a shadow table, then rename it over the live one
+SHADOW_SUFFIX = '__shadow'
+OLD_SUFFIX = '__old'
+SWAP_LOCK_TIMEOUT = os.getenv('PG_SWAP_LOCK_TIMEOUT', '2s')
+SWAP_RETRIES = int(os.getenv('PG_SWAP_RETRIES', 5))
+
+_INDEX_DEF = re.compile(r'^CREATE (UNIQUE )?INDEX (\S+) ON (?:ONLY )?(\S+) (USING .*)$')
+
+
+def create_shadow(cur, table_name, columns, column_types, unlogged=False):
+    """
+    (Re)create the empty shadow table for `table_name`, dropping any leftover
+    from an earlier run.
+
+    Returns:
+        str: The quoted shadow table name.
+    """
+    shadow = f'"{table_name}{SHADOW_SUFFIX}"'
+    cur.execute(f'DROP TABLE IF EXISTS {shadow}')
+    cur.execute(create_table_sql(shadow, columns, column_types, unlogged=unlogged))
+    return shadow
+
+
+def swap_index_name(index_name, tag):
+    """
+    Name for the `tag` ('shadow' or 'old') copy of index `index_name`: unique
+    through a hash of the full name and cut to PostgreSQL's 63-byte limit, so
+    it never collides with a live index however long the original name is.
+    """
+    name = f"{tag}_{zlib.crc32(index_name.encode()):08x}_{index_name}"
+    return name.encode()[:63].decode(errors='ignore')
+
+
+def build_shadow_indexes(cur, table_name):
+    """
+    Give the shadow table a copy of every index of the live table (built after
+    COPY, so the load never maintains them row by row), then ANALYZE it.
+
+    Shadow indexes get swap_index_name() names; the live name each one must
+    take at swap time is stored as its comment.
+
+    Returns:
+        int: Number of indexes built.
+    """
+    shadow = f'"{table_name}{SHADOW_SUFFIX}"'
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s",
+                (table_name,))
+    built = 0
+    for index_name, indexdef in cur.fetchall():
+        match = _INDEX_DEF.match(indexdef)
+        if not match:
+            print(f"⚠️ Can't copy index to shadow table: {indexdef}")
+            continue
+        unique, _, _, definition = match.groups()
+        shadow_index = swap_index_name(index_name, 'shadow')
+        cur.execute(f'CREATE {unique or ""}INDEX "{shadow_index}" ON {shadow} {definition}')
+        cur.execute(f'COMMENT ON INDEX "{shadow_index}" IS %s', (index_name,))
+        built += 1
+    cur.execute(f'ANALYZE {shadow}')
+    return built
+
+
+def swap_shadow(table_name, after_swap=None):
+    """
+    Atomically replace `table_name` with its shadow table.
+
+    The swap is a short transaction of renames under PG_SWAP_LOCK_TIMEOUT, so
+    it never queues behind long dashboard queries; if the lock can't be taken
+    it is retried with backoff. Readers see either the old or the new table,
+    never a missing or partial one. `after_swap` (e.g. a watermark update) runs
+    in the swap transaction. The old table is dropped afterwards, best effort.
+    """
+    import psycopg2
+
+    shadow, old = f"{table_name}{SHADOW_SUFFIX}", f"{table_name}{OLD_SUFFIX}"
+    for attempt in range(1, SWAP_RETRIES + 1):
+        try:
+            with pg_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT set_config('lock_timeout', %s, true)", (SWAP_LOCK_TIMEOUT,))
+                    # Leftover from a previous swap whose final DROP was skipped
+                    cur.execute(f'DROP TABLE IF EXISTS "{old}"')
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'public."{table_name}"',))
+                    if cur.fetchone()[0]:
+                        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s",
+                                    (table_name,))
+                        for (index_name,) in cur.fetchall():
+                            cur.execute(f'ALTER INDEX "{index_name}" RENAME TO "{swap_index_name(index_name, "old")}"')
+                        cur.execute(f'ALTER TABLE "{table_name}" RENAME TO "{old}"')
+                    cur.execute(f'ALTER TABLE "{shadow}" RENAME TO "{table_name}"')
+                    # Shadow indexes carry their live name as a comment (see build_shadow_indexes)
+                    cur.execute("""
+                        SELECT c.relname, obj_description(c.oid, 'pg_class')
+                        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE i.indrelid = to_regclass(%s)
+                    """, (f'public."{table_name}"',))
+                    for index_name, live_name in cur.fetchall():
+                        if live_name:
+                            cur.execute(f'ALTER INDEX "{index_name}" RENAME TO "{live_name}"')
+                            cur.execute(f'COMMENT ON INDEX "{live_name}" IS NULL')
+                    if after_swap:
+                        after_swap(cur)
+            break
+        except psycopg2.errors.LockNotAvailable:
+            if attempt == SWAP_RETRIES:
+                raise
+            wait = 2 ** attempt
+            print(f"⏳ \"{table_name}\" is busy — retrying swap in {wait}s ({attempt}/{SWAP_RETRIES})")
+            time.sleep(wait)
+    print(f"🔀 Swapped new \"{table_name}\" into place")
+
+    try:
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT set_config('lock_timeout', %s, true)", (SWAP_LOCK_TIMEOUT,))
+                cur.execute(f'DROP TABLE IF EXISTS "{old}"')
+    except psycopg2.errors.LockNotAvailable:
+        print(f"ℹ️ \"{old}\" is still in use — it will be dropped by the next load.")
+
+
+def shadow_load_to_postgres(df, table_name, column_types, after_copy=None):
+    """
+    'swap' mode of load_to_postgres: COPY into a shadow table, index and
+    ANALYZE it, then swap it in (see swap_shadow).
+    """
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            shadow = create_shadow(cur, table_name, df.columns, column_types)
+            copy_format = copy_dataframe(cur, df, shadow, column_types)
+            indexes = build_shadow_indexes(cur, table_name)
+    print(f"🌓 Loaded {len(df)} rows into {shadow} ({copy_format} COPY, {indexes} indexes)")
+    swap_shadow(table_name, after_copy)
+
+
+def create_merge_stage(cur, table_name):
+    """
+    Create a session-local staging table shaped like `table_name`, dropped on COMMIT.
+
+    Returns:
+        str: The quoted staging table name.
+    """
+    quoted_stage = f'"_stage_{table_name}"'
+    cur.execute(f'CREATE TEMP TABLE {quoted_stage} (LIKE "{table_name}" INCLUDING DEFAULTS) ON COMMIT DROP')
+    return quoted_stage
+
+
+def apply_merge_stage(cur, quoted_stage, table_name, columns, if_exists='merge', key_columns=None, partition_column=None):
+    """
+    Apply a staging table to `table_name` with one set-based statement.
+
+    'merge' upserts on `key_columns` with INSERT ... ON CONFLICT DO UPDATE,
+    only rewriting rows whose values changed. If no unique index can be built
+    on the key (e.g. the table already holds duplicates) it falls back to
+    DELETE + INSERT on the key. 'replace_partition' deletes every
+    `partition_column` value present in the stage and re-inserts it.
+
+    Returns:
+        tuple: (rows deleted or updated, rows inserted) as reported by Postgres.
+    """
+    import psycopg2
 
+    quoted_table_name = f'"{table_name}"'
+    cols = ', '.join([f'"{col}"' for col in columns])
+
+    if if_exists == 'replace_partition':
+        if not partition_column:
+            raise ValueError("replace_partition mode needs a partition_column")
+        cur.execute(f'''
+            DELETE FROM {quoted_table_name}
+            WHERE "{partition_column}" IN (SELECT DISTINCT "{partition_column}" FROM {quoted_stage})
+        ''')
+        deleted = cur.rowcount
+        cur.execute(f'INSERT INTO {quoted_table_name} ({cols}) SELECT {cols} FROM {quoted_stage}')
+        return deleted, cur.rowcount
+
+    if not key_columns:
+        raise ValueError("merge mode needs key_columns")
+    keys = ', '.join([f'"{col}"' for col in key_columns])
+    values = [col for col in columns if col not in key_columns]
+
+    cur.execute("SAVEPOINT merge_key_index")
+    try:
+        cur.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table_name}_merge_key" ON {quoted_table_name} ({keys})')
+        cur.execute("RELEASE SAVEPOINT merge_key_index")
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT merge_key_index")
+        print(f"⚠️ No unique index on ({keys}) for {quoted_table_name}, merging with DELETE + INSERT: {e}")
+        match = ' AND '.join([f't."{col}" = s."{col}"' for col in key_columns])
+        cur.execute(f'DELETE FROM {quoted_table_name} t USING {quoted_stage} s WHERE {match}')
+        deleted = cur.rowcount
+        cur.execute(f'''
+            INSERT INTO {quoted_table_name} ({cols})
+            SELECT DISTINCT ON ({keys}) {cols} FROM {quoted_stage} ORDER BY {keys}
+        ''')
+        return deleted, cur.rowcount
+
+    if values:
+        updates = ', '.join([f'"{col}" = EXCLUDED."{col}"' for col in values])
+        current = ', '.join([f'{quoted_table_name}."{col}"' for col in values])
+        excluded = ', '.join([f'EXCLUDED."{col}"' for col in values])
+        on_conflict = f'DO UPDATE SET {updates} WHERE ({current}) IS DISTINCT FROM ({excluded})'
+    else:
+        on_conflict = 'DO NOTHING'
+
+    cur.execute(f'''
+        INSERT INTO {quoted_table_name} ({cols})
+        SELECT DISTINCT ON ({keys}) {cols} FROM {quoted_stage} ORDER BY {keys}
+        ON CONFLICT ({keys}) {on_conflict}
+        RETURNING (xmax = 0)
+    ''')
+    inserted_flags = [row[0] for row in cur.fetchall()]
+    inserted = sum(inserted_flags)
+    return len(inserted_flags) - inserted, inserted
+
+
+def merge_to_postgres(df, table_name, if_exists='merge', key_columns=None, partition_column=None,
+                      after_copy=None, column_types=None):
+    """
+    Idempotently load a DataFrame: COPY it into a temporary staging table, then
+    merge it into `table_name` (see apply_merge_stage) in the same transaction.
+    The target table is created if it does not exist yet.
+    """
+    quoted_table_name = f'"{table_name}"'
+    column_types = {**postgres_types_from_dataframe(df), **(column_types or {})}
+    df = coerce_to_types(df, column_types)
+
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(create_table_sql(quoted_table_name, df.columns, column_types, if_not_exists=True))
+            quoted_stage = create_merge_stage(cur, table_name)
+            copy_dataframe(cur, df, quoted_stage, postgres_table_types(cur, table_name))
+            changed, inserted = apply_merge_stage(cur, quoted_stage, table_name, list(df.columns),
+                                                  if_exists, key_columns, partition_column)
+            if after_copy:
+                after_copy(cur)
+
+    print(f"🔀 Merged {len(df)} rows into {quoted_table_name}: {inserted} inserted, {changed} replaced/updated")
+    return inserted, changed
+
+
+PARALLEL_MODES = ('swap',) + MERGE_MODES
+
+
+def parallel_load_to_postgres(chunks, table_name, if_exists, columns, column_types, after_copy=None,
+                              key_columns=None, partition_column=None, workers=COPY_WORKERS):
+    """
+    Load DataFrame chunks with `workers` concurrent COPYs into an UNLOGGED
+    staging table, then publish it in one step:
+
+    - 'swap': the staging table is the shadow table; it is switched to LOGGED,
+      indexed and renamed into place (see swap_shadow). If no rows were
+      copied it is dropped instead, leaving the live table untouched.
+    - 'merge' / 'replace_partition': the staging table is merged into
+      `table_name` in one transaction (see apply_merge_stage) and dropped.
+
+    Returns:
+        int: Total number of rows loaded.
+    """
+    quoted_table_name = f'"{table_name}"'
+    if if_exists == 'swap':
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                stage = create_shadow(cur, table_name, columns, column_types, unlogged=True)
+                stage_types = column_types
+    else:
+        stage = f'"_pstage_{table_name}"'
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(create_table_sql(quoted_table_name, columns, column_types, if_not_exists=True))
+                cur.execute(f'DROP TABLE IF EXISTS {stage}')
+                cur.execute(f'CREATE UNLOGGED TABLE {stage} (LIKE {quoted_table_name} INCLUDING DEFAULTS)')
+                stage_types = postgres_table_types(cur, table_name)
+
+    coerced = (coerce_to_types(df, column_types) for df in chunks)
+    try:
+        stats = parallel_copy(coerced, stage, stage_types, workers)
+    except Exception:
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE IF EXISTS {stage}')
+        raise
+    total_rows = sum(stat['rows'] for stat in stats)
+
+    if if_exists == 'swap' and not total_rows:
+        # An empty shadow must never replace the live table
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE {stage}')
+        print(f"⚠️ No rows to load for {quoted_table_name} — live table left as is")
+        return 0
+
+    if if_exists == 'swap':
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                t0 = time.perf_counter()
+                cur.execute(f'ALTER TABLE {stage} SET LOGGED')
+                indexes = build_shadow_indexes(cur, table_name)
+        print(f"🌓 {stage} logged and indexed ({indexes} indexes) in {time.perf_counter() - t0:.2f}s")
+        swap_shadow(table_name, after_copy)
+        return total_rows
+
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            if total_rows:
+                changed, inserted = apply_merge_stage(cur, stage, table_name, list(columns),
+                                                      if_exists, key_columns, partition_column)
+                print(f"🔀 Merged into {quoted_table_name}: {inserted} inserted, {changed} replaced/updated")
+                if after_copy:
+                    after_copy(cur)
+            cur.execute(f'DROP TABLE {stage}')
+    return total_rows
+
+
+def load_to_postgres(df, table_name, if_exists='replace', after_copy=None, column_types=None,
+                     key_columns=None, partition_column=None, workers=COPY_WORKERS):
+    """
+    Load a DataFrame into PostgreSQL with COPY.
+
+    `if_exists` is 'replace' (drop and recreate), 'swap' (load a shadow
+    table and rename it into place, see swap_shadow), 'merge' (upsert on
+    `key_columns`), 'replace_partition' (swap out every `partition_column`
+    value present in `df`) or anything else to append.
+
+    New tables are created with `column_types` ({column: postgres type}),
+    falling back to types inferred from the DataFrame's dtypes.
+    `after_copy`, if given, is called with the COPY cursor before the COPY
+    transaction commits (e.g. to advance an extraction watermark).
+    With `workers` > 1, 'swap' and merge loads COPY over that many connections
+    (see parallel_load_to_postgres).
+
+    Failures are reported and re-raised, so callers know the load did not commit.
+
+    Returns:
+        int: Number of rows loaded.
+    """
     quoted_table_name = f'"{table_name}"'
     total_rows = len(df)
     print(f"📦 Preparing to load {total_rows} rows to table {quoted_table_name}")
 
     if total_rows == 0:
         print(f"⚠️ No data to load for table {quoted_table_name}")
-        return
+        return 0
+
+    if workers > 1 and if_exists in PARALLEL_MODES:
+        column_types = {**postgres_types_from_dataframe(df), **(column_types or {})}
+        try:
+            parallel_load_to_postgres(iter_slices(df, workers), table_name, if_exists, df.columns, column_types,
+                                      after_copy, key_columns, partition_column, workers)
+        except Exception as e:
+            print(f"❌ Parallel load failed: {e}")
+            raise
+        return total_rows
+
+    if if_exists in MERGE_MODES:
+        try:
+            merge_to_postgres(df, table_name, if_exists, key_columns, partition_column, after_copy, column_types)
+        except Exception as e:
+            print(f"❌ MERGE failed: {e}")
+            raise
+        return total_rows
+
+    column_types = {**postgres_types_from_dataframe(df), **(column_types or {})}
+    df = coerce_to_types(df, column_types)
+
+    if if_exists == 'swap':
+        try:
+            shadow_load_to_postgres(df, table_name, column_types, after_copy)
+        except Exception as e:
+            print(f"❌ SWAP load failed: {e}")
+            raise
+        return total_rows
 
     # Step 1: Drop table if exists
     if if_exists == 'replace':
         try:
-            with psycopg2.connect(dbname=database, user=user, password=password, host=host, port=port) as conn:
-                conn.set_session(autocommit=True)
+            with pg_connection(autocommit=True) as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         SELECT EXISTS (
@@ -50,7 +419,7 @@ def load_to_postgres(df, table_name, if_exists='replace'):
                             SELECT pid, state, query, wait_event_type, wait_event
                             FROM pg_stat_activity
                             WHERE datname = %s AND query ILIKE %s
-                        """, (database, f'%{table_name}%'))
+                        """, (conn.info.dbname, f'%{table_name}%'))
                         blockers = cur.fetchall()
 
                         if blockers:
@@ -76,43 +445,135 @@ def load_to_postgres(df, table_name, if_exists='replace'):
                         print(f"ℹ️ Table {quoted_table_name} does not exist — skipping drop.")
         except Exception as e:
             print(f"❌ DROP failed: {e}")
-            return
+            raise
 
     # Step 2: Create table
     try:
-        with psycopg2.connect(dbname=database, user=user, password=password, host=host, port=port) as conn:
-            conn.set_session(autocommit=True)
+        with pg_connection(autocommit=True) as conn:
             with conn.cursor() as cur:
-                cols = ', '.join([f'"{col}" TEXT' for col in df.columns])
-                cur.execute(f'CREATE TABLE {quoted_table_name} ({cols})')
+                cur.execute(create_table_sql(quoted_table_name, df.columns, column_types))
                 print(f"🧱 Created table {quoted_table_name} with {len(df.columns)} columns")
     except Exception as e:
         print(f"❌ CREATE failed: {e}")
           # Step 3: Load data
         try:
-            with psycopg2.connect(dbname=database, user=user, password=password, host=host, port=port) as conn:
-                conn.set_session(autocommit=True)
+            with pg_connection() as conn:
                 with conn.cursor() as cur:
-                    buffer = StringIO()
-                    df.to_csv(buffer, index=False, header=False)
-                    buffer.seek(0)
-                    cur.copy_expert(f'COPY {quoted_table_name} FROM STDIN WITH CSV', buffer)
-                    print(f"✅ Loaded {total_rows} rows into {quoted_table_name}")
+                    # The table already existed: encode for its real types
+                    copy_format = copy_dataframe(cur, df, quoted_table_name, postgres_table_types(cur, table_name))
+                    if after_copy:
+                        after_copy(cur)
+                    print(f"✅ Loaded {total_rows} rows into {quoted_table_name} ({copy_format} COPY)")
         except Exception as e:
             print(f"❌ COPY failed: {e}")
-            
-        return
+            raise
+        return total_rows
 
     # # Step 3: Load data
     try:
-        with psycopg2.connect(dbname=database, user=user, password=password, host=host, port=port) as conn:
-            conn.set_session(autocommit=True)
+        with pg_connection() as conn:
             with conn.cursor() as cur:
-                buffer = StringIO()
-                df.to_csv(buffer, index=False, header=False)
-                buffer.seek(0)
-                cur.copy_expert(f'COPY {quoted_table_name} FROM STDIN WITH CSV', buffer)
-                print(f"✅ Loaded {total_rows} rows into {quoted_table_name}")
+                copy_format = copy_dataframe(cur, df, quoted_table_name, column_types)
+                if after_copy:
+                    after_copy(cur)
+                print(f"✅ Loaded {total_rows} rows into {quoted_table_name} ({copy_format} COPY)")
     except Exception as e:
         print(f"❌ COPY failed: {e}")
+        raise
+    return total_rows
+
 
+def load_stream_to_postgres(chunks, table_name, if_exists='replace', after_copy=None, column_types=None,
+                            key_columns=None, partition_column=None, workers=COPY_WORKERS):
+    """
+    Load an iterable of DataFrame chunks into PostgreSQL, one COPY per chunk.
+
+    The whole load runs in a single transaction: in 'replace' mode the old
+    table is dropped and recreated inside it, so readers keep seeing the
+    previous data until the final COMMIT (but wait on its lock meanwhile);
+    'swap' mode never locks the live table except for the final rename.
+    Only the chunk currently being copied is held in memory.
+
+    Params:
+        chunks (iterable): DataFrames sharing the same columns.
+        table_name (str): Target table.
+        if_exists (str): 'replace' to drop/recreate the table, 'swap' to fill a
+            shadow table and rename it into place afterwards (a load that
+            copies no rows drops the shadow and keeps the live table), 'merge' or
+            'replace_partition' to COPY into a temporary stage and merge it
+            once at the end (see apply_merge_stage), anything else appends.
+        after_copy (callable): Called with the cursor before COMMIT if any rows were loaded.
+        column_types (dict): Postgres types for new tables; otherwise inferred from the first chunk.
+        key_columns (list): Natural key for 'merge' mode.
+        partition_column (str): Column whose values are replaced in 'replace_partition' mode.
+        workers (int): Concurrent COPY connections for 'swap' and merge modes
+            (see parallel_load_to_postgres); 1 keeps the single-transaction load.
+
+    Returns:
+        int: Total number of rows loaded.
+    """
+    quoted_table_name = f'"{table_name}"'
+
+    if workers > 1 and if_exists in PARALLEL_MODES:
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            print(f"⚠️ No data to load for table {quoted_table_name}")
+            return 0
+        column_types = {**postgres_types_from_dataframe(first), **(column_types or {})}
+        total_rows = parallel_load_to_postgres(itertools.chain([first], chunks), table_name, if_exists,
+                                               first.columns, column_types, after_copy, key_columns,
+                                               partition_column, workers)
+        print(f"✅ Loaded {total_rows} rows into {quoted_table_name}")
+        return total_rows
+
+    copy_target = quoted_table_name
+    total_rows = 0
+    chunk_num = 0
+
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            for df in chunks:
+                if chunk_num == 0:
+                    if if_exists == 'replace':
+                        cur.execute(f'DROP TABLE IF EXISTS {quoted_table_name}')
+                    column_types = {**postgres_types_from_dataframe(df), **(column_types or {})}
+                    if if_exists == 'swap':
+                        copy_target = create_shadow(cur, table_name, df.columns, column_types)
+                        table_types = column_types
+                    else:
+                        cur.execute(create_table_sql(quoted_table_name, df.columns, column_types, if_not_exists=True))
+                        # In append mode the table may predate this load: encode for its real types
+                        table_types = postgres_table_types(cur, table_name)
+                    if if_exists in MERGE_MODES:
+                        copy_target = create_merge_stage(cur, table_name)
+                    columns = list(df.columns)
+                chunk_num += 1
+                if len(df) == 0:
+                    continue
+                df = coerce_to_types(df, column_types)
+                copy_format = copy_dataframe(cur, df, copy_target, table_types)
+                total_rows += len(df)
+                print(f"  ↪ Chunk {chunk_num}: copied {len(df)} rows into {copy_target} ({copy_format})")
+            if if_exists in MERGE_MODES and total_rows:
+                changed, inserted = apply_merge_stage(cur, copy_target, table_name, columns,
+                                                      if_exists, key_columns, partition_column)
+                print(f"🔀 Merged into {quoted_table_name}: {inserted} inserted, {changed} replaced/updated")
+            if if_exists == 'swap' and chunk_num and not total_rows:
+                # Only empty chunks: an empty shadow must never replace the live table
+                cur.execute(f'DROP TABLE {copy_target}')
+            elif if_exists == 'swap' and chunk_num:
+                build_shadow_indexes(cur, table_name)
+            elif after_copy and total_rows:
+                after_copy(cur)
+
+    if if_exists == 'swap' and total_rows:
+        swap_shadow(table_name, after_copy)
+
+    if if_exists == 'swap' and not total_rows:
+        print(f"⚠️ No rows to load for {quoted_table_name} — live table left as is")
+    elif chunk_num == 0:
+        print(f"⚠️ No data to load for table {quoted_table_name}")
+    else:
+        print(f"✅ Loaded {total_rows} rows into {quoted_table_name}")
+    return total_rows
@@ -0,0 +1,172 @@
+import os
+import time
+import zlib
+from datetime import date
+
+from tools.conn import pg_connection
+from tools.pgpartitions import INTERVAL_MONTHS, PARTITION_INTERVAL, add_months, partition_start, partition_name
+
+# Post-load maintenance: secondary indexes, BRIN indexes on the append-ordered
+# date columns, targeted ANALYZE and optional clustering, run once a load has
+# finished so COPY never has to maintain indexes row by row.
+#
+# TABLE_MAINTENANCE declares, per table:
+#   'date_column': column used for BRIN, clustering and partition targeting
+#   'indexes':     btree indexes as tuples of columns
+# Every step is timed and recorded in MAINTENANCE_LOG_TABLE.
+
+TABLE_MAINTENANCE = {
+    "DailyTotals_Products_By_SKU": {
+        'date_column': "TransactionDate",
+        'indexes': [("LocationId", "TransactionDate"), ("SKU",)],
+    },
+    "StoreSales": {
+        'date_column': "Sales_Date",
+        'indexes': [("Store", "Sales_Date"), ("SKU", "Sales_Date"), ("Source",)],
+    },
+    "StoreSalesByUPC_2024_to_Q1_2025": {
+        'date_column': "Sales_Date",
+        'indexes': [("Store", "Sales_Date"), ("SKU",)],
+    },
+    "StoreSaleByDept_2024_to_Q1_2025": {
+        'date_column': "Sales_Date",
+        'indexes': [("Store", "Sales_Date")],
+    },
+    "StoreSalesUnkUPC_2024_to_Q1_2025": {
+        'date_column': "Sales_Date",
+        'indexes': [("Store", "Sales_Date")],
+    },
+    "rollup_daily_store_department": {
+        'date_column': "period",
+        'indexes': [("period", "Store", "Department")],
+    },
+    "rollup_weekly_brand": {
+        'date_column': "period",
+        'indexes': [("period", "Prod_Brand")],
+    },
+}
+
+MAINTENANCE_LOG_TABLE = "etl_maintenance_log"
+CLUSTER_AFTER_LOAD = os.getenv('PG_CLUSTER_AFTER_LOAD', 'false').lower() in ('1', 'true', 'yes')
+BRIN_PAGES_PER_RANGE = int(os.getenv('PG_BRIN_PAGES_PER_RANGE', 32))
+
+
+def index_name(table, columns, method='btree'):
+    """
+    Deterministic index name, shortened to fit PostgreSQL's 63-byte identifiers.
+    """
+    name = f"{table}_{'_'.join(columns)}_{method}".lower()
+    return name if len(name) <= 63 else name[:54] + f"_{zlib.crc32(name.encode()):08x}"
+
+
+def _partitions(cur, table, start, end):
+    """
+    Return the partitions of `table` covering [start, end], or [table] if it is not partitioned.
+    """
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+    """, (table,))
+    existing = {row[0] for row in cur.fetchall()}
+    if not existing:
+        return [table]
+
+    wanted, bound = [], partition_start(date.fromisoformat(str(start)[:10]))
+    while bound <= date.fromisoformat(str(end)[:10]):
+        name = partition_name(table, bound)
+        if name in existing:
+            wanted.append(name)
+        bound = add_months(bound, INTERVAL_MONTHS[PARTITION_INTERVAL])
+    return wanted
+
+
+def _record(cur, timings):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{MAINTENANCE_LOG_TABLE}" (
+            "run_at" TIMESTAMPTZ NOT NULL DEFAULT now(),
+            "table_name" TEXT NOT NULL,
+            "step" TEXT NOT NULL,
+            "seconds" DOUBLE PRECISION NOT NULL,
+            "status" TEXT NOT NULL
+        )
+    """)
+    for table, step, seconds, status in timings:
+        cur.execute(f"""
+            INSERT INTO "{MAINTENANCE_LOG_TABLE}" ("table_name", "step", "seconds", "status")
+            VALUES (%s, %s, %s, %s)
+        """, (table, step, seconds, status))
+
+
+def run_maintenance(tables, start=None, end=None, cluster=CLUSTER_AFTER_LOAD):
+    """
+    Run the post-load maintenance declared in TABLE_MAINTENANCE for `tables`.
+
+    With a [start, end] window, ANALYZE and CLUSTER only touch the partitions
+    holding those days; otherwise they cover the whole table. A failing step is
+    reported and skipped, it does not stop the others.
+
+    Returns:
+        list: (table, step, seconds, status) for every step that ran.
+    """
+    timings = []
+    with pg_connection(autocommit=True) as conn:
+        with conn.cursor() as cur:
+
+            def step(table, name, sql):
+                t0 = time.perf_counter()
+                try:
+                    cur.execute(sql)
+                    status = 'ok'
+                except Exception as e:
+                    status = f"error: {str(e).strip()}"
+                    print(f"⚠️ {name} on \"{table}\" failed: {str(e).strip()}")
+                elapsed = time.perf_counter() - t0
+                timings.append((table, name, elapsed, status))
+                print(f"🧹 {table}: {name} ({elapsed:.2f}s)")
+
+            for table in tables:
+                spec = TABLE_MAINTENANCE.get(table)
+                if spec is None:
+                    print(f"ℹ️ No maintenance declared for \"{table}\" — skipping.")
+                    continue
+                date_column = spec['date_column']
+
+                for columns in spec['indexes']:
+                    cols = ', '.join([f'"{col}"' for col in columns])
+                    step(table, f"index ({', '.join(columns)})",
+                         f'CREATE INDEX IF NOT EXISTS "{index_name(table, columns)}" ON "{table}" ({cols})')
+
+                step(table, f"brin ({date_column})",
+                     f'CREATE INDEX IF NOT EXISTS "{index_name(table, (date_column,), "brin")}" ON "{table}" '
+                     f'USING brin ("{date_column}") WITH (pages_per_range = {BRIN_PAGES_PER_RANGE})')
+
+                targets = _partitions(cur, table, start, end) if start and end else [table]
+
+                if cluster:
+                    date_index = index_name(table, (date_column,))
+                    step(table, f"index ({date_column})",
+                         f'CREATE INDEX IF NOT EXISTS "{date_index}" ON "{table}" ("{date_column}")')
+                    for target in targets:
+                        # Partitions get their own copy of the parent's index, found by its column
+                        cur.execute("""
+                            SELECT i.relname FROM pg_index x
+                            JOIN pg_class i ON i.oid = x.indexrelid
+                            JOIN pg_class t ON t.oid = x.indrelid
+                            JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = x.indkey[0]
+                            JOIN pg_am m ON m.oid = i.relam
+                            WHERE t.relname = %s AND a.attname = %s AND x.indnatts = 1 AND m.amname = 'btree'
+                        """, (target, date_column))
+                        row = cur.fetchone()
+                        if row:
+                            step(target, f"cluster ({date_column})", f'CLUSTER "{target}" USING "{row[0]}"')
+
+                for target in targets:
+                    step(target, "analyze", f'ANALYZE "{target}"')
+
+            _record(cur, timings)
+
+    total = sum(t[2] for t in timings)
+    print(f"✅ Maintenance finished: {len(timings)} steps in {total:.2f}s")
+    return timings
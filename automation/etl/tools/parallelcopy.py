@@ -0,0 +1,82 @@
+import os
+import time
+import threading
+
+from tools.conn import pg_connection, PG_POOL_MAX
+from tools.pgcopy import copy_from_dataframe
+
+# Parallel COPY: several pooled connections each run their own COPY into the
+# same (UNLOGGED) staging table, pulling DataFrame slices or stream chunks
+# from a shared iterator until it is exhausted. Each worker commits once, at
+# the end; the staging table is not visible to readers, so partial progress
+# is harmless and a failed load just drops it.
+
+COPY_WORKERS = int(os.getenv('PG_COPY_WORKERS', 1))
+# A DataFrame is cut into this many slices per worker, so fast workers take more
+SLICES_PER_WORKER = 4
+
+
+def iter_slices(df, workers):
+    """
+    Yield row slices of `df` for `workers` COPY workers.
+    """
+    size = max(len(df) // (workers * SLICES_PER_WORKER), 1)
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def parallel_copy(chunks, quoted_table_name, column_types=None, workers=COPY_WORKERS):
+    """
+    COPY an iterable of DataFrames into `quoted_table_name` over `workers` connections.
+
+    Returns:
+        list: per-worker dicts with rows, chunks, seconds and rows_per_sec.
+
+    Raises:
+        The first worker error, after every worker has stopped.
+    """
+    workers = max(1, min(workers, PG_POOL_MAX))
+    chunks = iter(chunks)
+    lock = threading.Lock()
+    failed = threading.Event()
+    stats = [{'worker': i, 'rows': 0, 'chunks': 0, 'seconds': 0.0} for i in range(workers)]
+    errors = []
+
+    def work(stat):
+        started = time.perf_counter()
+        try:
+            with pg_connection() as conn:
+                with conn.cursor() as cur:
+                    while not failed.is_set():
+                        with lock:
+                            df = next(chunks, None)
+                        if df is None:
+                            break
+                        if len(df) == 0:
+                            continue
+                        copy_from_dataframe(cur, df, quoted_table_name, column_types)
+                        stat['rows'] += len(df)
+                        stat['chunks'] += 1
+        except Exception as e:
+            failed.set()
+            errors.append(e)
+        finally:
+            stat['seconds'] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=work, args=(stat,), name=f"copy-{stat['worker']}") for stat in stats]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    for stat in stats:
+        stat['rows_per_sec'] = stat['rows'] / stat['seconds'] if stat['seconds'] else 0.0
+        print(f"  ↪ COPY worker {stat['worker']}: {stat['rows']} rows in {stat['chunks']} chunks, "
+              f"{stat['seconds']:.2f}s ({stat['rows_per_sec']:,.0f} rows/s)")
+    total_rows = sum(stat['rows'] for stat in stats)
+    wall = max(stat['seconds'] for stat in stats)
+    print(f"⚡ Parallel COPY into {quoted_table_name}: {total_rows} rows over {workers} connections "
+          f"({total_rows / wall if wall else 0:,.0f} rows/s)")
+    return stats
@@ -0,0 +1,148 @@
+import numbers
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+
+# This module splits one table into key ranges and reads the ranges in
+# parallel over several pooled connections, merging them back into a single
+# stream of chunks in range order.
+
+PARTITION_KINDS = ('date', 'histogram', 'numeric')
+
+
+def _literal(value):
+    """
+    Render a probe value as a SQL literal that works on SQL Server and PostgreSQL.
+    """
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def probe_ranges(engine, table, column, kind='date', partitions=4, where='1=1'):
+    """
+    Compute up to `partitions` contiguous, non-overlapping predicates on `column`.
+
+    Params:
+        engine: SQLAlchemy engine of the source.
+        table (str): Source table.
+        column (str): Partition key.
+        kind (str): 'date' splits [min, max] into whole days, 'numeric' splits
+            [min, max] evenly, 'histogram' balances row counts per distinct
+            value (e.g. LocationId).
+        partitions (int): Maximum number of ranges.
+        where (str): Filter the ranges must cover (e.g. the watermark window).
+
+    Returns:
+        list: SQL predicates, in key order. Empty if no rows match `where`.
+    """
+    if kind not in PARTITION_KINDS:
+        raise ValueError(f"partition kind must be one of {PARTITION_KINDS}")
+
+    quoted = f'"{column}"'
+
+    if kind == 'histogram':
+        histogram = pd.read_sql(
+            f'SELECT {quoted} AS value, COUNT(*) AS n FROM "{table}" WHERE {where} GROUP BY {quoted} ORDER BY {quoted}',
+            engine,
+        )
+        if histogram.empty:
+            return []
+        target = histogram['n'].sum() / partitions
+        predicates, first, running = [], None, 0
+        for value, n in zip(histogram['value'].tolist(), histogram['n'].tolist()):
+            first = value if first is None else first
+            running += n
+            if running >= target and len(predicates) < partitions - 1:
+                predicates.append(f"{quoted} >= {_literal(first)} AND {quoted} <= {_literal(value)}")
+                first, running = None, 0
+        if first is not None:
+            predicates.append(f"{quoted} >= {_literal(first)} AND {quoted} <= {_literal(value)}")
+        return predicates
+
+    bounds = pd.read_sql(f'SELECT MIN({quoted}) AS lo, MAX({quoted}) AS hi FROM "{table}" WHERE {where}', engine)
+    lo, hi = bounds['lo'].iloc[0], bounds['hi'].iloc[0]
+    if pd.isna(lo) or pd.isna(hi):
+        return []
+
+    if kind == 'date':
+        lo, hi = pd.Timestamp(lo).date(), pd.Timestamp(hi).date()
+        days = (hi - lo).days + 1
+        n = max(1, min(partitions, days))
+        edges = [lo + timedelta(days=(days * i) // n) for i in range(n)] + [hi + timedelta(days=1)]
+    else:
+        n = max(1, partitions)
+        if float(lo) == float(hi):
+            n = 1
+        edges = [lo + (hi - lo) * i / n for i in range(n)]
+        if float(lo).is_integer() and float(hi).is_integer():
+            edges = sorted(set(int(e) for e in edges))
+        edges.append(None)
+
+    predicates = []
+    for i, start in enumerate(edges[:-1]):
+        end = edges[i + 1]
+        if end is None:
+            predicates.append(f"{quoted} >= {_literal(start)} AND {quoted} <= {_literal(hi)}")
+        else:
+            predicates.append(f"{quoted} >= {_literal(start)} AND {quoted} < {_literal(end)}")
+    return predicates
+
+
+def iter_partitioned_chunks(engine, query, predicates, chunksize=100_000, workers=4, queue_size=2):
+    """
+    Read `query` once per predicate in parallel and yield the chunks in predicate order.
+
+    `query` must contain a `{partition}` placeholder for the predicate. Each
+    range is read on its own connection from the engine's pool and buffers at
+    most `queue_size` chunks, so ranges ahead of the one being consumed are
+    prefetched without holding whole ranges in memory.
+    """
+    if not predicates:
+        return
+
+    stop = threading.Event()
+    done = object()
+    queues = [queue.Queue(maxsize=queue_size) for _ in predicates]
+
+    def put(q, item):
+        # Give up once the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_range(i):
+        if stop.is_set():
+            return
+        try:
+            for chunk in pd.read_sql(query.format(partition=predicates[i]), engine, chunksize=chunksize):
+                if not put(queues[i], chunk):
+                    return
+            put(queues[i], done)
+        except Exception as e:
+            put(queues[i], e)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(predicates))), thread_name_prefix="range-reader")
+    try:
+        # Ranges start in order, so the one being consumed is always running or finished
+        for i in range(len(predicates)):
+            pool.submit(read_range, i)
+
+        for i, q in enumerate(queues):
+            while True:
+                item = q.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
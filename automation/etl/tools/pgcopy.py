@@ -0,0 +1,149 @@
+import struct
+
+# Encoders that feed COPY ... FROM STDIN straight from DataFrame columns,
+# without rendering the whole frame into one in-memory buffer first.
+#
+# - Binary COPY is used when every column has a fixed-width type and there are
+#   no NULLs: each batch of rows is laid out as one NumPy structured array in
+#   PostgreSQL's binary tuple format, so encoding is fully vectorized.
+# - Otherwise rows are rendered as CSV one batch at a time.
+#
+# Either way the data is exposed through CopyReader, a file-like object that
+# only ever holds one encoded batch, so extra memory stays constant.
+# NumPy and pandas are imported by the encoders, not at import time.
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+# Bytes psycopg2 pulls from the reader per round-trip
+COPY_READ_SIZE = 1 << 20
+
+# Postgres epoch (2000-01-01) relative to the Unix epoch
+PG_EPOCH_DAYS = 10_957
+PG_EPOCH_MICROS = PG_EPOCH_DAYS * 86_400 * 1_000_000
+
+BINARY_TYPES = {
+    'BIGINT': '>i8',
+    'INTEGER': '>i4',
+    'SMALLINT': '>i2',
+    'DOUBLE PRECISION': '>f8',
+    'REAL': '>f4',
+    'BOOLEAN': '?',
+    'DATE': '>i4',
+    'TIMESTAMP': '>i8',
+}
+
+
+class CopyReader:
+    """
+    File-like wrapper around an iterator of bytes, for cursor.copy_expert.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b'')
+        self._pos = 0
+
+    def read(self, size=-1):
+        parts = []
+        remaining = size
+        while size < 0 or remaining > 0:
+            if self._pos >= len(self._buffer):
+                try:
+                    self._buffer, self._pos = memoryview(next(self._chunks)), 0
+                except StopIteration:
+                    break
+                continue
+            end = len(self._buffer) if size < 0 else min(len(self._buffer), self._pos + remaining)
+            parts.append(self._buffer[self._pos:end])
+            remaining -= end - self._pos
+            self._pos = end
+        return b''.join(parts)
+
+
+def _binary_values(series, pg_type):
+    """
+    Convert a column to the NumPy representation used by binary COPY.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if pg_type == 'DATE':
+        days = pd.to_datetime(series).to_numpy(dtype='datetime64[D]').astype(np.int64)
+        return days - PG_EPOCH_DAYS
+    if pg_type == 'TIMESTAMP':
+        micros = pd.to_datetime(series).to_numpy(dtype='datetime64[us]').astype(np.int64)
+        return micros - PG_EPOCH_MICROS
+    if pg_type == 'BOOLEAN':
+        return series.to_numpy(dtype=bool)
+    return pd.to_numeric(series).to_numpy()
+
+
+def binary_columns(df, column_types):
+    """
+    Return [(column, pg_type, numpy dtype)] for binary COPY, or None if binary
+    COPY can't represent this DataFrame (variable-width types or NULLs).
+    """
+    import numpy as np
+
+    if not column_types:
+        return None
+    columns = []
+    for col in df.columns:
+        pg_type = column_types.get(col)
+        if pg_type not in BINARY_TYPES or df[col].isna().any():
+            return None
+        columns.append((col, pg_type, np.dtype(BINARY_TYPES[pg_type])))
+    return columns
+
+
+def iter_binary(df, columns, batch_rows=50_000):
+    """
+    Yield `df` as binary COPY data, converting one batch of rows at a time.
+    `columns` is the layout returned by binary_columns.
+    """
+    import numpy as np
+
+    fields = [('nfields', '>i2')]
+    for i, (_, _, dtype) in enumerate(columns):
+        fields += [(f'len{i}', '>i4'), (f'val{i}', dtype)]
+    layout = np.dtype(fields)
+
+    yield PGCOPY_HEADER
+    for start in range(0, len(df), batch_rows):
+        batch = df.iloc[start:start + batch_rows]
+        rows = np.empty(len(batch), dtype=layout)
+        rows['nfields'] = len(columns)
+        for i, (col, pg_type, dtype) in enumerate(columns):
+            rows[f'len{i}'] = dtype.itemsize
+            rows[f'val{i}'] = _binary_values(batch[col], pg_type)
+        yield rows.tobytes()
+    yield PGCOPY_TRAILER
+
+
+def iter_csv(df, batch_rows=50_000):
+    """
+    Yield `df` as CSV (no header) one batch of rows at a time.
+    """
+    for start in range(0, len(df), batch_rows):
+        yield df.iloc[start:start + batch_rows].to_csv(index=False, header=False).encode('utf-8')
+
+
+def copy_from_dataframe(cur, df, quoted_table_name, column_types=None, batch_rows=50_000):
+    """
+    COPY `df` into an existing table, in binary format when the column types
+    allow it and as batched CSV otherwise.
+
+    Returns:
+        str: 'binary' or 'csv', the format that was used.
+    """
+    cols = ', '.join([f'"{col}"' for col in df.columns])
+    columns = binary_columns(df, column_types)
+    if columns is not None:
+        reader = CopyReader(iter_binary(df, columns, batch_rows))
+        cur.copy_expert(f'COPY {quoted_table_name} ({cols}) FROM STDIN WITH (FORMAT binary)', reader, size=COPY_READ_SIZE)
+        return 'binary'
+
+    reader = CopyReader(iter_csv(df, batch_rows))
+    cur.copy_expert(f'COPY {quoted_table_name} ({cols}) FROM STDIN WITH CSV', reader, size=COPY_READ_SIZE)
+    return 'csv'
@@ -0,0 +1,266 @@
+import os
+from datetime import date
+
+# Declarative range partitioning of the sales tables on "Sales_Date".
+#
+# Each table is partitioned by month (or year), with a DEFAULT partition that
+# only catches rows whose Sales_Date is NULL or outside every created range.
+# Partitions are created ahead of time, so a day's load always lands in an
+# existing partition; queries that filter "Sales_Date" with plain literals
+# ("Sales_Date" >= '2025-01-01' AND "Sales_Date" < '2025-01-02') let the
+# planner prune every other partition.
+#
+# Bounds are written as ISO strings, which work for DATE, TIMESTAMP and
+# ISO-formatted TEXT partition keys alike.
+#
+# Loads only ever add partitions (prepare_partitions). Converting an existing
+# plain table is a one-off migration that locks it while its rows are copied:
+# see migrate_to_partitioned and pos/migrate_partitions.py.
+
+PARTITION_COLUMN = "Sales_Date"
+PARTITION_INTERVAL = os.getenv('PG_PARTITION_INTERVAL', 'month')
+PARTITIONS_AHEAD = int(os.getenv('PG_PARTITIONS_AHEAD', 2))
+
+SALES_TABLES = [
+    "StoreSales",
+    "StoreSalesByUPC_2024_to_Q1_2025",
+    "StoreSaleByDept_2024_to_Q1_2025",
+    "StoreSalesUnkUPC_2024_to_Q1_2025",
+]
+
+INTERVAL_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def add_months(day, months):
+    """
+    Return the first day of the month `months` months after `day`'s month.
+    """
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_start(day, interval=PARTITION_INTERVAL):
+    """
+    Return the first day of the `interval` partition containing `day`.
+    """
+    step = INTERVAL_MONTHS[interval]
+    return date(day.year, (day.month - 1) // step * step + 1, 1)
+
+
+def partition_name(table, start, interval=PARTITION_INTERVAL):
+    """
+    Name of the partition of `table` starting at `start`, e.g. StoreSales_p2025_01.
+    """
+    if interval == 'year':
+        return f"{table}_p{start.year}"
+    return f"{table}_p{start.year}_{start.month:02d}"
+
+
+def table_exists(cur, table):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'public."{table}"',))
+    return cur.fetchone()[0]
+
+
+def is_partitioned(cur, table):
+    """
+    True if `table` is already a partitioned (parent) table.
+    """
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = %s
+        )
+    """, (table,))
+    return cur.fetchone()[0]
+
+
+def ensure_partitions(cur, table, start, end, interval=PARTITION_INTERVAL):
+    """
+    Create the partitions of `table` covering [start, end], plus its DEFAULT partition.
+
+    Returns:
+        list: names of the partitions that were created.
+    """
+    cur.execute(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    created = []
+    bound = partition_start(start, interval)
+    while bound <= end:
+        upper = add_months(bound, INTERVAL_MONTHS[interval])
+        name = partition_name(table, bound, interval)
+        if not table_exists(cur, name):
+            cur.execute(f"""
+                CREATE TABLE "{name}" PARTITION OF "{table}"
+                FOR VALUES FROM ('{bound.isoformat()}') TO ('{upper.isoformat()}')
+            """)
+            created.append(name)
+        bound = upper
+
+    if created:
+        print(f"🧩 Created partitions of \"{table}\": {', '.join(created)}")
+    return created
+
+
+def _privileges(cur, relation, kind='TABLE'):
+    """
+    Return the statements that give `relation` (a regclass name) back its
+    current owner and privileges.
+    """
+    cur.execute("SELECT quote_ident(pg_get_userbyid(relowner)) FROM pg_class WHERE oid = to_regclass(%s)",
+                (relation,))
+    statements = [f"ALTER {kind} {relation} OWNER TO {cur.fetchone()[0]}"]
+    cur.execute("""
+        SELECT a.privilege_type,
+               CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(a.grantee)) END,
+               a.is_grantable
+        FROM pg_class c, aclexplode(c.relacl) a
+        WHERE c.oid = to_regclass(%s)
+    """, (relation,))
+    for privilege, grantee, grantable in cur.fetchall():
+        statements.append(f"GRANT {privilege} ON {relation} TO {grantee}{' WITH GRANT OPTION' if grantable else ''}")
+    return statements
+
+
+def _restore_optional(cur, table, statement):
+    """
+    Run `statement` in a savepoint; a partitioned table can't take every index
+    or constraint of the heap (unique ones must include the partition key),
+    so a failure is reported instead of aborting the migration.
+    """
+    cur.execute("SAVEPOINT restore_object")
+    try:
+        cur.execute(statement)
+        cur.execute("RELEASE SAVEPOINT restore_object")
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT restore_object")
+        print(f"⚠️ Not restored on partitioned \"{table}\": {statement} ({str(e).strip()})")
+
+
+def migrate_to_partitioned(cur, table, interval=PARTITION_INTERVAL):
+    """
+    One-off migration: rebuild the plain heap `table` as a table partitioned
+    by range on Sales_Date, moving its rows into monthly (or `interval`)
+    partitions.
+
+    Column defaults, CHECK constraints, identity columns, owned (serial)
+    sequences, primary/unique/foreign keys, indexes, the owner, privileges
+    and the plain views selecting from `table` are carried over. Tables
+    referenced by foreign keys or by materialized views are refused.
+
+    `table` stays ACCESS EXCLUSIVE locked until the caller commits, so run
+    it off-hours through pos/migrate_partitions.py, never from a daily load.
+    """
+    relation = f'public."{table}"'
+    old = f"{table}_unpartitioned"
+    cur.execute(f'LOCK TABLE {relation} IN ACCESS EXCLUSIVE MODE')
+
+    cur.execute("SELECT conrelid::regclass::text FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(%s)",
+                (relation,))
+    referencing = [row[0] for row in cur.fetchall()]
+    if referencing:
+        raise ValueError(f"\"{table}\" is referenced by foreign keys from {referencing}; drop them first")
+
+    # Everything the rebuilt table must get back, captured before the rename
+    cur.execute("""
+        SELECT DISTINCT v.oid::regclass::text, v.relkind, pg_get_viewdef(v.oid)
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass AND d.refobjid = to_regclass(%s) AND v.oid <> d.refobjid
+    """, (relation,))
+    views = cur.fetchall()
+    materialized = [name for name, kind, _ in views if kind != 'v']
+    if materialized:
+        raise ValueError(f"Materialized views {materialized} depend on \"{table}\"; drop them first")
+    view_privileges = {name: _privileges(cur, name, 'VIEW') for name, _, _ in views}
+    privileges = _privileges(cur, relation)
+    cur.execute("""
+        SELECT format('ALTER TABLE %%s ADD CONSTRAINT %%I %%s', %s, conname, pg_get_constraintdef(oid))
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'x', 'f')
+        ORDER BY contype = 'f', conname
+    """, (relation, relation))
+    constraints = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid)
+    """, (relation,))
+    indexes = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT s.oid::regclass::text, a.attname
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.refobjid = to_regclass(%s) AND d.deptype = 'a'
+    """, (relation,))
+    owned_sequences = cur.fetchall()
+    cur.execute("SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attidentity <> ''",
+                (relation,))
+    identity_columns = [row[0] for row in cur.fetchall()]
+
+    print(f"🧩 Converting \"{table}\" to a partitioned table on \"{PARTITION_COLUMN}\"...")
+    for name, _, _ in views:
+        cur.execute(f"DROP VIEW {name}")
+    cur.execute(f'ALTER TABLE {relation} RENAME TO "{old}"')
+    cur.execute(f"""
+        CREATE TABLE {relation} (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY
+                                 INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS INCLUDING STATISTICS)
+        PARTITION BY RANGE ("{PARTITION_COLUMN}")
+    """)
+
+    cur.execute(f'SELECT min("{PARTITION_COLUMN}"::date), max("{PARTITION_COLUMN}"::date) FROM "{old}"')
+    low, high = cur.fetchone()
+    if low is not None:
+        ensure_partitions(cur, table, low, high, interval)
+    else:
+        cur.execute(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF {relation} DEFAULT')
+
+    cur.execute(f'INSERT INTO {relation} OVERRIDING SYSTEM VALUE SELECT * FROM "{old}"')
+    print(f"🧩 Moved {cur.rowcount} rows into partitioned \"{table}\"")
+
+    # Serial sequences follow the new table, so dropping the old one keeps them
+    for sequence, column in owned_sequences:
+        cur.execute(f'ALTER SEQUENCE {sequence} OWNED BY {relation}."{column}"')
+    cur.execute(f'DROP TABLE "{old}"')
+
+    # Index and constraint names are free again once the old table is gone
+    for statement in constraints + indexes:
+        _restore_optional(cur, table, statement)
+    for column in identity_columns:
+        cur.execute(f"""
+            SELECT setval(pg_get_serial_sequence(%s, %s), coalesce(max("{column}"), 1), max("{column}") IS NOT NULL)
+            FROM {relation}
+        """, (relation, column))
+    for statement in privileges:
+        cur.execute(statement)
+    for name, _, definition in views:
+        cur.execute(f"CREATE VIEW {name} AS {definition}")
+        for statement in view_privileges[name]:
+            cur.execute(statement)
+    print(f"✅ \"{table}\" is partitioned ({len(constraints) + len(indexes)} constraints/indexes, "
+          f"{len(views)} views, {len(privileges) - 1} grants carried over)")
+
+
+def prepare_partitions(cur, table, start, end, interval=PARTITION_INTERVAL, ahead=PARTITIONS_AHEAD):
+    """
+    Make sure the partitioned `table` has partitions for [start, end] and for
+    the next `ahead` intervals after today.
+    Missing tables are left alone (they are created by their own loaders), and
+    so are plain tables: converting one is an explicit step (migrate_to_partitioned).
+    """
+    if not table_exists(cur, table):
+        print(f"⚠️ Table \"{table}\" does not exist — skipping partition setup.")
+        return
+    if not is_partitioned(cur, table):
+        print(f"⚠️ Table \"{table}\" is not partitioned — skipping partition setup "
+              f"(convert it with: python pos/migrate_partitions.py \"{table}\").")
+        return
+
+    start = date.fromisoformat(str(start)[:10])
+    end = date.fromisoformat(str(end)[:10])
+    horizon = add_months(partition_start(date.today(), interval), INTERVAL_MONTHS[interval] * ahead)
+    ensure_partitions(cur, table, min(start, date.today()), max(end, horizon), interval)
@@ -0,0 +1,436 @@
+import os
+import gzip
+import time
+import hashlib
+import threading
+from collections import Counter
+
+from tools.conn import pg_connection
+
+# PMR IntelliShelf raw shelf export.
+#
+# The export is a CSV whose columns and types are declared in PMR_SCHEMA.
+# PmrParser reads it in vectorized blocks (pyarrow's CSV reader, or pandas
+# when pyarrow is missing) and casts each batch of at most PMR_BATCH_ROWS rows
+# to the schema, so only one batch is held in memory and typed columns load
+# straight into typed Postgres columns (NUMERIC values are validated but kept
+# as text, so prices are never rounded through float). Malformed lines and
+# unparseable values are set aside and written to QUARANTINE_TABLE by
+# record_parse(), with per-export counters in PARSE_LOG_TABLE.
+#
+# Raw exports are fetched over one shared keep-alive requests.Session (gzip
+# transfer encoding) and kept gzip-compressed in PMR_CACHE_DIR, keyed by
+# endpoint and date window. fetch_pmr() serves a window from the cache while
+# it is younger than PMR_CACHE_TTL hours, so reloading or reprocessing a day
+# reads local disk instead of calling the API again. The oldest files are
+# evicted once the cache grows past PMR_CACHE_MAX_MB, except those fetched but
+# not loaded yet: fetch_pmr() pins its file until load_pmr_file() releases it.
+#
+# pyarrow, pandas and requests are imported on first use, not at import time.
+
+PMR_URL = os.getenv('PMR_URL', 'https://www.pmrintellishelf.com/api/rawdata/shelf')
+PMR_TIMEOUT = int(os.getenv('PMR_TIMEOUT', 300))
+PMR_BATCH_ROWS = int(os.getenv('PMR_BATCH_ROWS', 50_000))
+PMR_CACHE_DIR = os.getenv('PMR_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.pmr_cache'))
+PMR_CACHE_TTL = float(os.getenv('PMR_CACHE_TTL', 24))  # hours; 0 always refetches
+PMR_CACHE_MAX_MB = float(os.getenv('PMR_CACHE_MAX_MB', 500))
+PMR_POOL_SIZE = int(os.getenv('PMR_POOL_SIZE', 8))
+
+# Read size of the vectorized CSV reader
+PMR_BLOCK_SIZE = int(os.getenv('PMR_BLOCK_SIZE', 4 << 20))
+# strftime format of the "date" column
+PMR_DATE_FORMAT = os.getenv('PMR_DATE_FORMAT', '%Y-%m-%d')
+# Where observations go: 'shelf' (change-only state, see tools.pmrshelf),
+# 'raw' (one row per observation merged into the pmr table) or 'both'.
+# Defaults to 'both' while consumers of the pmr table migrate to the shelf
+# state; once none read pmr any more, set PMR_STORAGE=shelf to stop filling it.
+PMR_STORAGE = os.getenv('PMR_STORAGE', 'both')
+PMR_STORAGE_MODES = ('shelf', 'raw', 'both')
+QUARANTINE_TABLE = "pmr_quarantine"
+PARSE_LOG_TABLE = "pmr_parse_log"
+
+# Column → Postgres type, in file order
+PMR_SCHEMA = {
+    "id": 'TEXT',
+    "date": 'DATE',
+    "time": 'TIME',
+    "productCode": 'TEXT',
+    "category": 'TEXT',
+    "brand": 'TEXT',
+    "productUPC": 'TEXT',
+    "productCustomerCode": 'TEXT',
+    "product": 'TEXT',
+    "outletCode": 'TEXT',
+    "outlet": 'TEXT',
+    "chain": 'TEXT',
+    "facing": 'INTEGER',
+    "totalFacings": 'INTEGER',
+    "noos": 'TEXT',
+    "promo": 'TEXT',
+    "price": 'NUMERIC',
+    "specialPrice": 'NUMERIC',
+}
+PMR_COLUMNS = list(PMR_SCHEMA)
+# What a (trimmed) value must look like to be cast to its type
+VALUE_PATTERNS = {
+    'INTEGER': r'^[+-]?\d+(\.0*)?$',
+    'NUMERIC': r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$',
+    'DATE': r'^\S+$',
+    'TIME': r'^\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?(\s*[AaPp][Mm])?$',
+}
+
+
+def pmr_url(from_date, to_date):
+    return f'{PMR_URL}?from={from_date}&to={to_date}'
+
+
+def pmr_headers():
+    return {'Authorization': f"Bearer {os.getenv('token')}", 'Accept-Encoding': 'gzip'}
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def pmr_session():
+    """
+    The shared keep-alive session for PMR requests (created on first use).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+            _session.headers.update(pmr_headers())
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=PMR_POOL_SIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def cache_path(from_date, to_date):
+    endpoint = hashlib.sha1(PMR_URL.encode()).hexdigest()[:12]
+    return os.path.join(PMR_CACHE_DIR, f"{from_date}_{to_date}_{endpoint}.csv.gz")
+
+
+# Cache path → number of fetches not yet released (see release_cache)
+_pinned = Counter()
+_pinned_lock = threading.Lock()
+
+
+def release_cache(path):
+    """
+    Unpin a file returned by fetch_pmr(), making it evictable again.
+    """
+    with _pinned_lock:
+        _pinned[path] -= 1
+        if _pinned[path] <= 0:
+            del _pinned[path]
+
+
+def evict_cache(max_mb=PMR_CACHE_MAX_MB, ttl_hours=PMR_CACHE_TTL):
+    """
+    Delete expired cache files, then the least recently written ones until
+    the cache fits in `max_mb`. Pinned files (fetched, not loaded yet) are never deleted.
+    """
+    if not os.path.isdir(PMR_CACHE_DIR):
+        return
+    files = []
+    for name in os.listdir(PMR_CACHE_DIR):
+        if name.endswith('.csv.gz'):
+            try:
+                stat = os.stat(os.path.join(PMR_CACHE_DIR, name))
+            except FileNotFoundError:
+                continue  # evicted by another worker
+            files.append((stat.st_mtime, stat.st_size, name))
+    files.sort()
+
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    for mtime, size, name in files:
+        if now - mtime <= ttl_hours * 3600 and total <= max_mb * 1024 * 1024:
+            continue
+        path = os.path.join(PMR_CACHE_DIR, name)
+        with _pinned_lock:
+            if path in _pinned:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass  # evicted by another worker
+
+
+def fetch_pmr(from_date, to_date, refresh=False):
+    """
+    Return the path of the gzip-compressed raw export for [from_date, to_date],
+    downloading it unless a fresh copy is already cached.
+    The file stays pinned against eviction until release_cache(path)
+    (load_pmr_file() releases it once loaded).
+
+    Raises:
+        requests.HTTPError: for error responses (the cache is left untouched).
+    """
+    path = cache_path(from_date, to_date)
+    # Pin before checking the cache, so a concurrent eviction can't remove a hit
+    with _pinned_lock:
+        _pinned[path] += 1
+    try:
+        return _fetch_pmr(path, from_date, to_date, refresh)
+    except BaseException:
+        release_cache(path)
+        raise
+
+
+def _fetch_pmr(path, from_date, to_date, refresh):
+    if not refresh and os.path.exists(path) and time.time() - os.path.getmtime(path) < PMR_CACHE_TTL * 3600:
+        print(f"♻️ PMR {from_date} → {to_date} served from cache ({os.path.getsize(path) / 1024:,.0f} KiB)")
+        return path
+
+    os.makedirs(PMR_CACHE_DIR, exist_ok=True)
+    t0 = time.perf_counter()
+    tmp = f"{path}.{threading.get_ident()}.part"
+    try:
+        with pmr_session().get(pmr_url(from_date, to_date), stream=True, timeout=PMR_TIMEOUT) as response:
+            response.raise_for_status()
+            with gzip.open(tmp, 'wb', compresslevel=6) as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"🌐 PMR {from_date} → {to_date} downloaded in {time.perf_counter() - t0:.1f}s "
+          f"({os.path.getsize(path) / 1024:,.0f} KiB cached)")
+    evict_cache()
+    return path
+
+
+class PmrParser:
+    """
+    Iterate the typed batches of a cached export (see fetch_pmr).
+
+    Lines with the wrong number of fields, values that don't parse as their
+    PMR_SCHEMA type and rows with a blank `required` column are kept out of
+    the batches and collected in `rejected` as (line, reason, raw text);
+    `counts` tallies rows read, loaded and rejected. Both are complete once
+    iteration finishes.
+    """
+
+    def __init__(self, path, batch_rows=PMR_BATCH_ROWS, required=()):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.required = set(required)
+        self.rejected = []
+        self.counts = {'rows': 0, 'loaded': 0, 'bad_lines': 0, 'bad_values': 0}
+
+    def _bad_line(self, number, reason, text):
+        self.rejected.append((number, reason, text))
+        self.counts['bad_lines'] += 1
+
+    def _bad_values(self, rows, reasons):
+        self.rejected += [(None, reason, ','.join([value or '' for value in row]))
+                          for row, reason in zip(rows, reasons)]
+        self.counts['bad_values'] += len(reasons)
+
+    def _arrow_batches(self):
+        """
+        Read the export with pyarrow and cast each batch with Arrow compute kernels.
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.compute as pc
+
+        def invalid_row(row):
+            self._bad_line(row.number, f"{row.actual_columns} columns, expected {row.expected_columns}", row.text)
+            return 'skip'
+
+        reader = pa_csv.open_csv(
+            self.path,
+            read_options=pa_csv.ReadOptions(column_names=PMR_COLUMNS, skip_rows=1, block_size=PMR_BLOCK_SIZE),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=invalid_row),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in PMR_COLUMNS},
+                strings_can_be_null=False, quoted_strings_can_be_null=False,
+            ),
+        )
+
+        def convert(table):
+            self.counts['rows'] += table.num_rows
+            columns, reason = [], pa.nulls(table.num_rows, pa.string())
+            for col, pg_type in PMR_SCHEMA.items():
+                raw = table.column(col)
+                if pg_type == 'TEXT':
+                    if col in self.required:
+                        missing = pc.invert(pc.fill_null(pc.not_equal(pc.utf8_trim_whitespace(raw), ''), False))
+                        reason = pc.if_else(pc.and_(missing, pc.is_null(reason)), f"missing {col}", reason)
+                    columns.append(raw)
+                    continue
+                trimmed = pc.utf8_trim_whitespace(raw)
+                present = pc.not_equal(trimmed, '')
+                valid = pc.match_substring_regex(trimmed, VALUE_PATTERNS[pg_type])
+                usable = pc.and_(present, valid)
+                values = pc.if_else(usable, trimmed, pa.scalar(None, pa.string()))
+                # NUMERIC values stay validated text: Postgres parses them exactly on COPY
+                if pg_type == 'INTEGER':
+                    values = pc.cast(pc.cast(values, pa.float64()), pa.int64())
+                elif pg_type == 'DATE':
+                    values = pc.strptime(values, format=PMR_DATE_FORMAT, unit='s', error_is_null=True)
+                    usable = pc.and_(usable, pc.is_valid(values))
+                    values = pc.cast(values, pa.date32())
+                invalid = pc.and_(present, pc.invert(usable))
+                reason = pc.if_else(pc.and_(invalid, pc.is_null(reason)), f"invalid {col}", reason)
+                columns.append(values)
+
+            typed = pa.Table.from_arrays(columns, names=PMR_COLUMNS)
+            bad = pc.is_valid(reason)
+            if pc.any(bad).as_py():
+                self._bad_values([list(row.values()) for row in table.filter(bad).to_pylist()],
+                                 reason.filter(bad).to_pylist())
+                typed = typed.filter(pc.invert(bad))
+            return typed.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get, date_as_object=False)
+
+        import pandas as pd
+
+        pending = []
+        for record_batch in reader:
+            pending.append(record_batch)
+            if sum(len(b) for b in pending) >= self.batch_rows:
+                yield convert(pa.Table.from_batches(pending))
+                pending = []
+        if pending:
+            yield convert(pa.Table.from_batches(pending))
+
+    def _pandas_batches(self):
+        """
+        Without pyarrow: read with pandas' python engine and cast with pandas.
+
+        That engine calls back for lines with too many fields; lines with too
+        few come back padded with NaN in the last column.
+        """
+        import pandas as pd
+
+        def invalid_row(fields):
+            self._bad_line(None, f"{len(fields)} columns, expected {len(PMR_COLUMNS)}", ','.join(fields))
+            return None
+
+        for df in pd.read_csv(self.path, compression='gzip', names=PMR_COLUMNS, header=0, dtype=str,
+                              keep_default_na=False, engine='python', on_bad_lines=invalid_row,
+                              chunksize=self.batch_rows):
+            short = df[PMR_COLUMNS[-1]].isna()
+            for line, row in df[short].iterrows():
+                fields = [value for value in row.tolist() if isinstance(value, str)]
+                self._bad_line(line + 2, f"{len(fields)} columns, expected {len(PMR_COLUMNS)}", ','.join(fields))
+            df = df[~short].reset_index(drop=True)
+            self.counts['rows'] += len(df)
+
+            reasons = pd.Series(None, index=df.index, dtype=object)
+            typed = {}
+            for col, pg_type in PMR_SCHEMA.items():
+                raw = df[col]
+                if pg_type == 'TEXT':
+                    if col in self.required:
+                        missing = raw.isna() | raw.str.strip().eq('')
+                        reasons = reasons.mask(missing & reasons.isna(), f"missing {col}")
+                    typed[col] = raw
+                    continue
+                trimmed = raw.str.strip()
+                present = trimmed.ne('')
+                usable = present & trimmed.str.match(VALUE_PATTERNS[pg_type])
+                values = trimmed.where(usable)
+                if pg_type == 'INTEGER':
+                    values = pd.to_numeric(values).astype('Int64')
+                elif pg_type == 'DATE':
+                    values = pd.to_datetime(values, format=PMR_DATE_FORMAT, errors='coerce')
+                    usable &= values.notna()
+                invalid = present & ~usable
+                reasons = reasons.mask(invalid & reasons.isna(), f"invalid {col}")
+                typed[col] = values
+
+            bad = reasons.notna()
+            if bad.any():
+                self._bad_values(df[bad].values.tolist(), reasons[bad].tolist())
+            yield pd.DataFrame(typed)[~bad]
+
+    def __iter__(self):
+        try:
+            import pyarrow.csv  # noqa: F401 - optional, see _arrow_batches
+            batches = self._arrow_batches()
+        except ImportError:
+            batches = self._pandas_batches()
+        for df in batches:
+            self.counts['loaded'] += len(df)
+            yield df
+        self.counts['rows'] += self.counts['bad_lines']
+
+
+def ensure_quarantine_tables(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{QUARANTINE_TABLE}" (
+            "source" TEXT NOT NULL,
+            "line" BIGINT,
+            "reason" TEXT NOT NULL,
+            "raw" TEXT,
+            "quarantined_at" TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{PARSE_LOG_TABLE}" (
+            "source" TEXT NOT NULL,
+            "rows" BIGINT NOT NULL,
+            "loaded" BIGINT NOT NULL,
+            "bad_lines" BIGINT NOT NULL,
+            "bad_values" BIGINT NOT NULL,
+            "parsed_at" TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def record_parse(cur, source, parser):
+    """
+    Store the rows `parser` rejected in QUARANTINE_TABLE and its counters in PARSE_LOG_TABLE.
+    """
+    ensure_quarantine_tables(cur)
+    if parser.rejected:
+        cur.executemany(f'INSERT INTO "{QUARANTINE_TABLE}" ("source", "line", "reason", "raw") VALUES (%s, %s, %s, %s)',
+                        [(source, line, reason, raw) for line, reason, raw in parser.rejected])
+    counts = parser.counts
+    cur.execute(f"""
+        INSERT INTO "{PARSE_LOG_TABLE}" ("source", "rows", "loaded", "bad_lines", "bad_values")
+        VALUES (%s, %s, %s, %s, %s)
+    """, (source, counts['rows'], counts['loaded'], counts['bad_lines'], counts['bad_values']))
+    flag = "⚠️" if parser.rejected else "🧾"
+    print(f"{flag} PMR {source}: {counts['loaded']} of {counts['rows']} rows loaded, "
+          f"{counts['bad_lines']} malformed lines and {counts['bad_values']} bad values quarantined")
+
+
+def load_pmr_file(etl, path, source):
+    """
+    Parse a cached export (see fetch_pmr) and load it batch by batch into the
+    storage chosen by PMR_STORAGE, then quarantine its rejected rows under `source`.
+    The file is released for eviction afterwards, whether or not the load succeeded.
+
+    Returns:
+        int: Rows loaded.
+    """
+    try:
+        if PMR_STORAGE not in PMR_STORAGE_MODES:
+            raise ValueError(f"PMR_STORAGE must be one of {PMR_STORAGE_MODES}, not '{PMR_STORAGE}'")
+        if PMR_STORAGE in ('shelf', 'both'):
+            from tools.pmrshelf import SHELF_KEYS, load_shelf_observations
+
+            # Observations without an outlet or product code can't be placed on the shelf
+            parser = PmrParser(path, required=SHELF_KEYS)
+            rows = load_shelf_observations(parser, source)['rows']
+        else:
+            parser = PmrParser(path)
+        if PMR_STORAGE in ('raw', 'both'):
+            raw = PmrParser(path) if PMR_STORAGE == 'both' else parser
+            rows = etl.load_pmr_stream(iter(raw), table='pmr', column_types=PMR_SCHEMA)
+        with pg_connection() as conn:
+            with conn.cursor() as cur:
+                record_parse(cur, source, parser)
+        return rows
+    finally:
+        release_cache(path)
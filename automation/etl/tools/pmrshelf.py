@@ -0,0 +1,270 @@
+import os
+
+from tools.conn import pg_connection
+from tools.pgcopy import copy_from_dataframe
+from tools.sqlregistry import register
+
+# Change-only storage of PMR shelf observations.
+#
+# Most PMR rows repeat yesterday's observation of the same outlet/product
+# pair. Instead of one 18-column text row per observation, shelf state is kept
+# as:
+# - dictionary-encoded dimensions: pmr_dim_chain, pmr_dim_outlet and
+#   pmr_dim_product map the PMR codes to small integer ids;
+# - a validity-interval fact, pmr_shelf_state: one row per outlet/product per
+#   run of days with the same SHELF_ATTRIBUTES, valid over
+#   [valid_from, valid_to). A new row is only written when an attribute changes.
+#
+# Loading a batch re-derives the intervals of the affected pairs around the
+# batch's date range (so windows can be loaded in any order): the existing
+# intervals are expanded to days inside the range, overridden by the new
+# observations, and consecutive runs with equal attributes are collapsed
+# again. A state carries over days with no observation until it changes.
+#
+# pmr_shelf_as_of(date) returns the shelf as it stood on a day, in the
+# layout of the raw pmr table; pmr_shelf_current is the shelf today. A pair's
+# last known state counts for PMR_SHELF_MAX_AGE days after it was last seen
+# (exports lag and skip days); pairs unseen for longer are treated as delisted.
+#
+# Rows without an outletCode or productCode (SHELF_KEYS) can't be placed on
+# the shelf: the parser quarantines them (see tools.pmr.load_pmr_file).
+
+CHAIN_TABLE = "pmr_dim_chain"
+OUTLET_TABLE = "pmr_dim_outlet"
+PRODUCT_TABLE = "pmr_dim_product"
+STATE_TABLE = "pmr_shelf_state"
+STAGE_TABLE = "_pmr_observations"
+SHELF_MAX_AGE = int(os.getenv('PMR_SHELF_MAX_AGE', 7))  # days
+SHELF_KEYS = ("outletCode", "productCode")
+
+SHELF_ATTRIBUTES = {
+    "facing": 'INTEGER',
+    "totalFacings": 'INTEGER',
+    "noos": 'TEXT',
+    "promo": 'TEXT',
+    "price": 'NUMERIC',
+    "specialPrice": 'NUMERIC',
+}
+PRODUCT_ATTRIBUTES = ["productUPC", "productCustomerCode", "product", "category", "brand"]
+STAGE_TYPES = {
+    "date": 'DATE', "time": 'TIME', "outletCode": 'TEXT', "outlet": 'TEXT', "chain": 'TEXT',
+    "productCode": 'TEXT', **{col: 'TEXT' for col in PRODUCT_ATTRIBUTES}, **SHELF_ATTRIBUTES,
+}
+
+KEY = '"outlet_id", "product_id"'
+ATTRS = ', '.join([f'"{col}"' for col in SHELF_ATTRIBUTES])
+SAME_AS_PREVIOUS = ' AND '.join([f'"{col}" IS NOT DISTINCT FROM lag("{col}") OVER w' for col in SHELF_ATTRIBUTES])
+
+
+def _cols(columns, prefix=''):
+    return ', '.join([f'{prefix}"{col}"' for col in columns])
+
+
+def ensure_shelf_tables(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{CHAIN_TABLE}" (
+            "chain_id" SERIAL PRIMARY KEY,
+            "chain" TEXT NOT NULL UNIQUE
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{OUTLET_TABLE}" (
+            "outlet_id" SERIAL PRIMARY KEY,
+            "outletCode" TEXT NOT NULL UNIQUE,
+            "outlet" TEXT,
+            "chain_id" INTEGER REFERENCES "{CHAIN_TABLE}"
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{PRODUCT_TABLE}" (
+            "product_id" SERIAL PRIMARY KEY,
+            "productCode" TEXT NOT NULL UNIQUE,
+            {', '.join([f'"{col}" TEXT' for col in PRODUCT_ATTRIBUTES])}
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{STATE_TABLE}" (
+            "outlet_id" INTEGER NOT NULL REFERENCES "{OUTLET_TABLE}",
+            "product_id" INTEGER NOT NULL REFERENCES "{PRODUCT_TABLE}",
+            "valid_from" DATE NOT NULL,
+            "valid_to" DATE NOT NULL,
+            {', '.join([f'"{col}" {pg_type}' for col, pg_type in SHELF_ATTRIBUTES.items()])},
+            PRIMARY KEY ("outlet_id", "product_id", "valid_from")
+        )
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION pmr_shelf_as_of(as_of DATE)
+        RETURNS TABLE (
+            "date" DATE, "outletCode" TEXT, "outlet" TEXT, "chain" TEXT, "productCode" TEXT,
+            {', '.join([f'"{col}" TEXT' for col in PRODUCT_ATTRIBUTES])},
+            {', '.join([f'"{col}" {pg_type}' for col, pg_type in SHELF_ATTRIBUTES.items()])},
+            "valid_from" DATE, "last_seen" DATE
+        )
+        LANGUAGE sql STABLE AS $$
+            SELECT as_of, o."outletCode", o."outlet", c."chain", p."productCode",
+                   {_cols(PRODUCT_ATTRIBUTES, 'p.')}, {_cols(SHELF_ATTRIBUTES, 's.')},
+                   s."valid_from", s."valid_to" - 1
+            FROM (
+                SELECT DISTINCT ON ({KEY}) *
+                FROM "{STATE_TABLE}"
+                WHERE "valid_from" <= as_of
+                ORDER BY {KEY}, "valid_from" DESC
+            ) s
+            JOIN "{OUTLET_TABLE}" o USING ("outlet_id")
+            JOIN "{PRODUCT_TABLE}" p USING ("product_id")
+            LEFT JOIN "{CHAIN_TABLE}" c USING ("chain_id")
+            WHERE as_of < s."valid_to" + {SHELF_MAX_AGE}
+        $$
+    """)
+    cur.execute("CREATE OR REPLACE VIEW pmr_shelf_current AS SELECT * FROM pmr_shelf_as_of(current_date)")
+
+
+def upsert_dimensions(cur):
+    """
+    Add new chains, outlets and products from the stage; refresh changed descriptions.
+    Rows with a NULL or empty code are skipped (the parser already quarantines them).
+    """
+    cur.execute(f"""
+        INSERT INTO "{CHAIN_TABLE}" ("chain")
+        SELECT DISTINCT coalesce("chain", '') FROM "{STAGE_TABLE}"
+        WHERE "outletCode" <> ''
+        ON CONFLICT ("chain") DO NOTHING
+    """)
+    latest = 'ORDER BY {key}, "date" DESC, "time" DESC NULLS LAST'
+    cur.execute(f"""
+        INSERT INTO "{OUTLET_TABLE}" ("outletCode", "outlet", "chain_id")
+        SELECT DISTINCT ON ("outletCode") o."outletCode", o."outlet", c."chain_id"
+        FROM "{STAGE_TABLE}" o
+        JOIN "{CHAIN_TABLE}" c ON c."chain" = coalesce(o."chain", '')
+        WHERE o."outletCode" <> ''
+        {latest.format(key='o."outletCode"')}
+        ON CONFLICT ("outletCode") DO UPDATE SET "outlet" = EXCLUDED."outlet", "chain_id" = EXCLUDED."chain_id"
+        WHERE ("{OUTLET_TABLE}"."outlet", "{OUTLET_TABLE}"."chain_id") IS DISTINCT FROM (EXCLUDED."outlet", EXCLUDED."chain_id")
+    """)
+    updates = ', '.join([f'"{col}" = EXCLUDED."{col}"' for col in PRODUCT_ATTRIBUTES])
+    cur.execute(f"""
+        INSERT INTO "{PRODUCT_TABLE}" ("productCode", {_cols(PRODUCT_ATTRIBUTES)})
+        SELECT DISTINCT ON ("productCode") "productCode", {_cols(PRODUCT_ATTRIBUTES)}
+        FROM "{STAGE_TABLE}"
+        WHERE "productCode" <> ''
+        {latest.format(key='"productCode"')}
+        ON CONFLICT ("productCode") DO UPDATE SET {updates}
+        WHERE ({_cols(PRODUCT_ATTRIBUTES, f'"{PRODUCT_TABLE}".')}) IS DISTINCT FROM ({_cols(PRODUCT_ATTRIBUTES, 'EXCLUDED.')})
+    """)
+
+
+def apply_observations(cur):
+    """
+    Fold the staged observations into STATE_TABLE (see the module comment).
+
+    Returns:
+        dict: observations (one per pair and day), intervals replaced and intervals written.
+    """
+    # Latest observation per outlet/product/day, keyed by dimension ids
+    cur.execute(f"""
+        CREATE TEMP TABLE "_pmr_days" ON COMMIT DROP AS
+        SELECT DISTINCT ON ({KEY}, "day") o."outlet_id", p."product_id", s."date" AS "day", {_cols(SHELF_ATTRIBUTES, 's.')}
+        FROM "{STAGE_TABLE}" s
+        JOIN "{OUTLET_TABLE}" o USING ("outletCode")
+        JOIN "{PRODUCT_TABLE}" p USING ("productCode")
+        WHERE s."date" IS NOT NULL
+        ORDER BY {KEY}, "day", s."time" DESC NULLS LAST
+    """)
+    observations = cur.rowcount
+    cur.execute('SELECT min("day"), max("day") + 1 FROM "_pmr_days"')
+    first, after = cur.fetchone()
+    if first is None:
+        return {'observations': 0, 'replaced': 0, 'written': 0}
+    window = {'first': first, 'after': after}
+
+    # Intervals of the affected pairs that overlap or touch the range, plus each
+    # pair's nearest interval on either side so equal states can merge across gaps
+    cur.execute(f'CREATE TEMP TABLE "_pmr_old" (LIKE "{STATE_TABLE}") ON COMMIT DROP')
+    cur.execute(f"""
+        WITH keys AS (SELECT DISTINCT {KEY} FROM "_pmr_days")
+        INSERT INTO "_pmr_old"
+        SELECT s.* FROM "{STATE_TABLE}" s JOIN keys USING ("outlet_id", "product_id")
+        WHERE s."valid_to" >= %(first)s AND s."valid_from" <= %(after)s
+        UNION
+        SELECT * FROM (
+            SELECT DISTINCT ON ({KEY}) s.* FROM "{STATE_TABLE}" s JOIN keys USING ("outlet_id", "product_id")
+            WHERE s."valid_from" < %(first)s ORDER BY {KEY}, s."valid_from" DESC
+        ) before_range
+        UNION
+        SELECT * FROM (
+            SELECT DISTINCT ON ({KEY}) s.* FROM "{STATE_TABLE}" s JOIN keys USING ("outlet_id", "product_id")
+            WHERE s."valid_from" > %(after)s ORDER BY {KEY}, s."valid_from"
+        ) after_range
+    """, window)
+    cur.execute(f"""
+        DELETE FROM "{STATE_TABLE}" s USING "_pmr_old" o
+        WHERE s."outlet_id" = o."outlet_id" AND s."product_id" = o."product_id" AND s."valid_from" = o."valid_from"
+    """)
+    replaced = cur.rowcount
+
+    # Old intervals clipped to outside the range, old states on the range's days
+    # without a new observation, and the new observations; then islands of
+    # consecutive pieces with equal attributes collapse into one interval each
+    cur.execute(f"""
+        WITH pieces AS (
+            SELECT {KEY}, "valid_from", least("valid_to", %(first)s) AS "valid_to", {ATTRS}
+            FROM "_pmr_old" WHERE "valid_from" < %(first)s
+            UNION ALL
+            SELECT {KEY}, greatest("valid_from", %(after)s), "valid_to", {ATTRS}
+            FROM "_pmr_old" WHERE "valid_to" > %(after)s
+            UNION ALL
+            SELECT o."outlet_id", o."product_id", d.day::date, d.day::date + 1, {_cols(SHELF_ATTRIBUTES, 'o.')}
+            FROM "_pmr_old" o
+            CROSS JOIN LATERAL generate_series(greatest(o."valid_from", %(first)s),
+                                               least(o."valid_to", %(after)s) - 1, interval '1 day') AS d(day)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM "_pmr_days" n
+                WHERE n."outlet_id" = o."outlet_id" AND n."product_id" = o."product_id" AND n."day" = d.day::date
+            )
+            UNION ALL
+            SELECT {KEY}, "day", "day" + 1, {ATTRS} FROM "_pmr_days"
+        ),
+        marked AS (
+            SELECT *, CASE WHEN {SAME_AS_PREVIOUS} THEN 0 ELSE 1 END AS "starts"
+            FROM pieces
+            WINDOW w AS (PARTITION BY {KEY} ORDER BY "valid_from")
+        ),
+        islands AS (
+            SELECT *, sum("starts") OVER (PARTITION BY {KEY} ORDER BY "valid_from") AS "island"
+            FROM marked
+        )
+        INSERT INTO "{STATE_TABLE}" ({KEY}, "valid_from", "valid_to", {ATTRS})
+        SELECT {KEY}, min("valid_from"), max("valid_to"), {ATTRS}
+        FROM islands
+        GROUP BY {KEY}, "island", {ATTRS}
+    """, window)
+    return {'observations': observations, 'replaced': replaced, 'written': cur.rowcount}
+
+
+def load_shelf_observations(batches, source=''):
+    """
+    COPY PMR observation batches (see tools.pmr.PmrParser) into a stage and
+    fold them into the shelf state, in one transaction.
+
+    Returns:
+        dict: rows staged plus the counters of apply_observations.
+    """
+    rows = 0
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            ensure_shelf_tables(cur)
+            columns = ', '.join([f'"{col}" {pg_type}' for col, pg_type in STAGE_TYPES.items()])
+            cur.execute(f'CREATE TEMP TABLE "{STAGE_TABLE}" ({columns}) ON COMMIT DROP')
+            for df in batches:
+                if len(df):
+                    copy_from_dataframe(cur, df[list(STAGE_TYPES)], f'"{STAGE_TABLE}"', STAGE_TYPES)
+                    rows += len(df)
+            upsert_dimensions(cur)
+            report = {'rows': rows, **apply_observations(cur)}
+
+    print(f"🗜️ PMR {source}: {report['rows']} rows → {report['observations']} daily observations; "
+          f"{report['replaced']} intervals rewritten as {report['written']}")
+    return report
+
+
+register("pmr_shelf_as_of", 'SELECT * FROM pmr_shelf_as_of(%(end)s::date)')
@@ -0,0 +1,195 @@
+import os
+import json
+
+from tools.conn import pg_connection
+
+# Single-scan table profiles.
+#
+# profile_table() computes, for every column of a table, the null count,
+# min/max and value-length stats in ONE aggregate query (one scan, one
+# round-trip), instead of one query per column. Approximate distinct counts
+# come from the planner statistics in pg_stats, so they cost no scan at all.
+# Large tables can be profiled from a TABLESAMPLE instead of a full scan.
+#
+# Profiles are cached in PROFILE_TABLE per table and load batch. The default
+# batch is a change signature of the table (its storage file plus its
+# insert/update/delete counters), so an unchanged table is never rescanned.
+
+PROFILE_TABLE = "etl_table_profiles"
+# Tables estimated above this many rows are profiled from a sample
+PROFILE_SAMPLE_ROWS = int(os.getenv('PROFILE_SAMPLE_ROWS', 5_000_000))
+
+ORDERED_TYPES = (
+    'smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision', 'money',
+    'date', 'time', 'timestamp', 'interval', 'text', 'character', 'uuid',
+)
+TEXT_TYPES = ('text', 'character', 'character varying')
+
+
+def table_columns(cur, table, schema='public'):
+    """
+    Return [(column, type)] of `table` in ordinal order, with type modifiers stripped
+    (e.g. 'numeric', 'timestamp', 'character varying').
+    """
+    cur.execute("""
+        SELECT a.attname, format_type(a.atttypid, NULL)
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+    """, (f'{schema}."{table}"',))
+    return [(name, pg_type.split(' without')[0].split(' with')[0]) for name, pg_type in cur.fetchall()]
+
+
+def change_signature(cur, table, schema='public'):
+    """
+    A string that changes whenever `table` is written to, truncated or recreated.
+
+    Partitioned tables have no storage or counters of their own, so the
+    signature is built over their leaf partitions (a plain table is its own
+    only leaf); attaching or detaching a partition changes it too.
+    """
+    cur.execute("""
+        SELECT string_agg(c.relfilenode::text, ',' ORDER BY c.oid), sum(coalesce(s.n_tup_ins, 0)),
+               sum(coalesce(s.n_tup_upd, 0)), sum(coalesce(s.n_tup_del, 0))
+        FROM pg_partition_tree(to_regclass(%s)) t
+        JOIN pg_class c ON c.oid = t.relid
+        LEFT JOIN pg_stat_user_tables s ON s.relid = t.relid
+        WHERE t.isleaf
+    """, (f'{schema}."{table}"',))
+    row = cur.fetchone()
+    return ':'.join([str(value) for value in row]) if row and row[0] is not None else None
+
+
+def _estimated_rows(cur, table, schema='public'):
+    # Summed over the leaves: a partitioned parent has no reltuples of its own
+    cur.execute("""
+        SELECT sum(greatest(c.reltuples, 0))
+        FROM pg_partition_tree(to_regclass(%s)) t
+        JOIN pg_class c ON c.oid = t.relid
+        WHERE t.isleaf
+    """, (f'{schema}."{table}"',))
+    row = cur.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def profile_table(cur, table, sample_percent=None, schema='public'):
+    """
+    Profile every column of `table` in one scan.
+
+    `sample_percent` reads only that share of the table's pages
+    (TABLESAMPLE SYSTEM); by default it is chosen automatically for tables
+    estimated above PROFILE_SAMPLE_ROWS rows.
+
+    Returns:
+        dict: row_count, sample_percent and columns {name: {type, nulls, min, max,
+        distinct, min_length, avg_length, max_length}}.
+    """
+    columns = table_columns(cur, table, schema)
+    if not columns:
+        raise ValueError(f"Table '{schema}.{table}' not found")
+
+    if sample_percent is None:
+        estimated = _estimated_rows(cur, table, schema)
+        if estimated > PROFILE_SAMPLE_ROWS:
+            sample_percent = round(max(PROFILE_SAMPLE_ROWS / estimated * 100, 0.01), 4)
+
+    select = ['count(*)']
+    for name, pg_type in columns:
+        col = f'"{name}"'
+        select.append(f'count(*) - count({col})')
+        if pg_type in ORDERED_TYPES or pg_type in TEXT_TYPES:
+            select += [f'min({col})::text', f'max({col})::text']
+        elif pg_type == 'boolean':
+            select += [f'min({col}::int)::text', f'max({col}::int)::text']
+        else:
+            select += ['NULL', 'NULL']
+        if pg_type in TEXT_TYPES:
+            select += [f'min(length({col}))', f'avg(length({col}))::float8', f'max(length({col}))']
+        else:
+            select += ['NULL', 'NULL', 'NULL']
+
+    sample = f' TABLESAMPLE SYSTEM ({sample_percent})' if sample_percent else ''
+    cur.execute(f'SELECT {", ".join(select)} FROM "{schema}"."{table}"{sample}')
+    row = cur.fetchone()
+
+    # n_distinct < 0 is a fraction of the row count, > 0 an absolute estimate
+    cur.execute("SELECT attname, n_distinct FROM pg_stats WHERE schemaname = %s AND tablename = %s",
+                (schema, table))
+    n_distinct = dict(cur.fetchall())
+    estimated_rows = _estimated_rows(cur, table, schema)
+
+    profile = {'row_count': row[0], 'sample_percent': sample_percent, 'columns': {}}
+    for i, (name, pg_type) in enumerate(columns):
+        nulls, low, high, min_len, avg_len, max_len = row[1 + i * 6: 7 + i * 6]
+        distinct = n_distinct.get(name)
+        if distinct is not None and distinct < 0:
+            distinct = -distinct * estimated_rows
+        profile['columns'][name] = {
+            'type': pg_type, 'nulls': nulls, 'min': low, 'max': high,
+            'distinct': round(distinct) if distinct is not None else None,
+            'min_length': min_len, 'avg_length': avg_len, 'max_length': max_len,
+        }
+    return profile
+
+
+def ensure_profile_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{PROFILE_TABLE}" (
+            "table_name" TEXT PRIMARY KEY,
+            "load_batch" TEXT NOT NULL,
+            "profile" JSONB NOT NULL,
+            "profiled_at" TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def profile_tables(tables, load_batch=None, sample_percent=None, force=False):
+    """
+    Profile `tables`, reusing the cached profile of any table whose load batch
+    is unchanged since it was last profiled.
+
+    `load_batch` identifies the data a caller just loaded (e.g. a watermark);
+    by default each table's change_signature() is used.
+
+    Returns:
+        dict: {table: profile} (see profile_table); missing tables are skipped.
+    """
+    profiles = {}
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            ensure_profile_table(cur)
+            for table in tables:
+                batch = str(load_batch) if load_batch is not None else change_signature(cur, table)
+                if batch is None:
+                    print(f"⚠️ Table '{table}' not found — skipping profile.")
+                    continue
+
+                if not force:
+                    cur.execute(f'SELECT "profile" FROM "{PROFILE_TABLE}" WHERE "table_name" = %s AND "load_batch" = %s',
+                                (table, batch))
+                    cached = cur.fetchone()
+                    if cached:
+                        print(f"♻️ '{table}' unchanged since its last profile — skipping scan.")
+                        profiles[table] = cached[0]
+                        continue
+
+                profile = profile_table(cur, table, sample_percent)
+                sampled = f" from a {profile['sample_percent']}% sample" if profile['sample_percent'] else ''
+                print(f"🔎 Profiled '{table}': {profile['row_count']} rows, "
+                      f"{len(profile['columns'])} columns{sampled}")
+
+                cur.execute(f"""
+                    INSERT INTO "{PROFILE_TABLE}" ("table_name", "load_batch", "profile", "profiled_at")
+                    VALUES (%s, %s, %s, now())
+                    ON CONFLICT ("table_name") DO UPDATE
+                    SET "load_batch" = EXCLUDED."load_batch", "profile" = EXCLUDED."profile", "profiled_at" = now()
+                """, (table, batch, json.dumps(profile, default=str)))
+                profiles[table] = profile
+    return profiles
+
+
+def columns_with_nulls(profile):
+    """
+    Names of the columns that contain NULLs according to `profile`.
+    """
+    return [name for name, stats in profile['columns'].items() if stats['nulls']]
@@ -0,0 +1,152 @@
+import os
+import math
+from datetime import date, timedelta
+
+from tools.conn import pg_connection
+from tools.pgpartitions import table_exists
+from tools.sqlregistry import register, execute
+
+# Pre-aggregated rollups of StoreSales for the Metabase dashboards.
+#
+# Each rollup groups StoreSales by a time grain ('day' or 'week') plus some
+# dimensions and sums the measures. Rollups are refreshed incrementally: only
+# the periods overlapping the days that were just reloaded are deleted and
+# re-aggregated, reading just those day slices (and partitions) of StoreSales.
+# After every refresh the rollup is checked against the base table for the
+# same periods.
+
+BASE_TABLE = "StoreSales"
+DATE_COLUMN = "Sales_Date"
+MEASURES = ["Qty_Sold", "Total_Sold", "Weight_Sold"]
+
+# Float sums depend on the order rows are added in, so the rollup check only
+# flags measure totals that differ by more than these tolerances
+CHECK_REL_TOL = float(os.getenv('ROLLUP_CHECK_REL_TOL', 1e-9))
+CHECK_ABS_TOL = float(os.getenv('ROLLUP_CHECK_ABS_TOL', 0.005))
+
+ROLLUPS = {
+    "rollup_daily_store_department": {'grain': 'day', 'dimensions': ["Store", "Department"]},
+    "rollup_weekly_brand": {'grain': 'week', 'dimensions': ["Prod_Brand"]},
+}
+
+GRAIN_SQL = {
+    'day': f'"{DATE_COLUMN}"::date',
+    'week': f'''date_trunc('week', "{DATE_COLUMN}"::timestamp)::date''',
+}
+
+
+def period_bounds(start, end, grain):
+    """
+    Widen [start, end] to whole periods of `grain`.
+
+    Returns:
+        tuple: (first day, day after the last period) as dates.
+    """
+    start = date.fromisoformat(str(start)[:10])
+    end = date.fromisoformat(str(end)[:10])
+    if grain == 'week':
+        start -= timedelta(days=start.weekday())
+        end += timedelta(days=6 - end.weekday())
+    return start, end + timedelta(days=1)
+
+
+def _aggregate_sql(spec, windowed=True):
+    dims = ', '.join([f'"{col}"' for col in spec['dimensions']])
+    sums = ', '.join([f'sum("{col}") AS "{col}"' for col in MEASURES])
+    where = f'WHERE "{DATE_COLUMN}" >= %(first)s AND "{DATE_COLUMN}" < %(after)s' if windowed else ''
+    return f"""
+        SELECT {GRAIN_SQL[spec['grain']]} AS "period", {dims}, {sums}, count(*) AS "row_count"
+        FROM "{BASE_TABLE}"
+        {where}
+        GROUP BY 1, {', '.join([str(i + 2) for i in range(len(spec['dimensions']))])}
+    """
+
+
+def create_rollup(cur, name, spec):
+    """
+    Create rollup table `name` (typed like StoreSales) and fill it from the whole base table.
+    """
+    cur.execute(f'CREATE TABLE "{name}" AS {_aggregate_sql(spec, windowed=False)}')
+    print(f"📊 Built rollup \"{name}\" from all of \"{BASE_TABLE}\" ({cur.rowcount} rows)")
+
+
+def refresh_rollup(cur, name, spec, start, end):
+    """
+    Replace the periods of rollup `name` overlapping [start, end] with fresh aggregates.
+
+    Returns:
+        tuple: (rows deleted, rows inserted)
+    """
+    first, after = period_bounds(start, end, spec['grain'])
+    cur.execute(f'DELETE FROM "{name}" WHERE "period" >= %s AND "period" < %s', (first, after))
+    deleted = cur.rowcount
+    execute(cur, f"rollup_refresh_{name}", {'first': str(first), 'after': str(after)})
+    return deleted, cur.rowcount
+
+
+def totals_match(got, expected):
+    """
+    True when two measure totals agree within CHECK_REL_TOL / CHECK_ABS_TOL.
+    """
+    return math.isclose(float(got or 0), float(expected or 0), rel_tol=CHECK_REL_TOL, abs_tol=CHECK_ABS_TOL)
+
+
+def check_rollup(cur, name, spec, start, end):
+    """
+    Compare rollup `name` with StoreSales over the periods overlapping [start, end].
+    Row counts must match exactly, measure totals within a tolerance (see totals_match).
+
+    Returns:
+        list: (measure, rollup total, base total) for every total that differs.
+    """
+    first, after = period_bounds(start, end, spec['grain'])
+    totals = ', '.join([f'sum("{col}")' for col in MEASURES + ["row_count"]])
+    cur.execute(f'SELECT {totals} FROM "{name}" WHERE "period" >= %s AND "period" < %s', (first, after))
+    rollup = cur.fetchone()
+    base_totals = ', '.join([f'sum("{col}")' for col in MEASURES] + ['count(*)'])
+    cur.execute(f"""
+        SELECT {base_totals} FROM "{BASE_TABLE}"
+        WHERE "{DATE_COLUMN}" >= %s AND "{DATE_COLUMN}" < %s
+    """, (str(first), str(after)))
+    base = cur.fetchone()
+    mismatches = [
+        (measure, got, expected)
+        for measure, got, expected in zip(MEASURES, rollup, base)
+        if not totals_match(got, expected)
+    ]
+    if (rollup[-1] or 0) != (base[-1] or 0):
+        mismatches.append(("row_count", rollup[-1], base[-1]))
+    return mismatches
+
+
+for _name, _spec in ROLLUPS.items():
+    register(f"rollup_refresh_{_name}", f'INSERT INTO "{_name}" {_aggregate_sql(_spec)}')
+
+
+def refresh_rollups(start, end, rollups=None):
+    """
+    Incrementally refresh `rollups` (default: all of ROLLUPS) for the days in
+    [start, end], in one transaction, and verify them against StoreSales.
+    Rollups that do not exist yet are built from the whole base table.
+
+    Returns:
+        dict: {rollup: {'deleted': rows, 'inserted': rows, 'mismatches': [...]}}
+    """
+    report = {}
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            for name in rollups or ROLLUPS:
+                spec = ROLLUPS[name]
+                if not table_exists(cur, name):
+                    create_rollup(cur, name, spec)
+                    deleted, inserted = 0, cur.rowcount
+                else:
+                    deleted, inserted = refresh_rollup(cur, name, spec, start, end)
+
+                mismatches = check_rollup(cur, name, spec, start, end)
+                report[name] = {'deleted': deleted, 'inserted': inserted, 'mismatches': mismatches}
+
+                print(f"📊 {name}: {deleted} rows replaced, {inserted} rows inserted")
+                for measure, got, expected in mismatches:
+                    print(f"⚠️ {name}.{measure} = {got} but {BASE_TABLE} has {expected} for {start} → {end}")
+    return report
@@ -0,0 +1,155 @@
+# This module derives PostgreSQL column types for the loader, either from the
+# SQL Server catalog (INFORMATION_SCHEMA.COLUMNS) or from DataFrame dtypes,
+# so target tables get real date/bigint/numeric columns instead of TEXT.
+# pandas is imported by the functions that need it, not at import time.
+
+SQLSERVER_TO_POSTGRES = {
+    'bigint': 'BIGINT',
+    'int': 'INTEGER',
+    'smallint': 'SMALLINT',
+    'tinyint': 'SMALLINT',
+    'bit': 'BOOLEAN',
+    'decimal': 'NUMERIC',
+    'numeric': 'NUMERIC',
+    'money': 'NUMERIC(19, 4)',
+    'smallmoney': 'NUMERIC(10, 4)',
+    'float': 'DOUBLE PRECISION',
+    'real': 'REAL',
+    'date': 'DATE',
+    'datetime': 'TIMESTAMP',
+    'datetime2': 'TIMESTAMP',
+    'smalldatetime': 'TIMESTAMP',
+    'datetimeoffset': 'TIMESTAMPTZ',
+    'time': 'TIME',
+    'uniqueidentifier': 'UUID',
+}
+
+INTEGER_TYPES = ('BIGINT', 'INTEGER', 'SMALLINT')
+TEMPORAL_TYPES = ('DATE', 'TIMESTAMP', 'TIMESTAMPTZ', 'TIME')
+
+
+def get_sqlserver_columns(engine, table_name, schema='dbo') -> list:
+    """
+    Return the column definitions of a SQL Server table, in ordinal order.
+
+    Returns:
+        list: dicts with name, data_type, max_length, precision, scale and nullable.
+    """
+    import pandas as pd
+
+    columns = pd.read_sql("""
+        SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH,
+               NUMERIC_PRECISION, NUMERIC_SCALE, IS_NULLABLE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?
+        ORDER BY ORDINAL_POSITION
+    """, engine, params=(schema, table_name))
+
+    return [
+        {
+            'name': row.COLUMN_NAME,
+            'data_type': row.DATA_TYPE.lower(),
+            'max_length': None if pd.isna(row.CHARACTER_MAXIMUM_LENGTH) else int(row.CHARACTER_MAXIMUM_LENGTH),
+            'precision': None if pd.isna(row.NUMERIC_PRECISION) else int(row.NUMERIC_PRECISION),
+            'scale': None if pd.isna(row.NUMERIC_SCALE) else int(row.NUMERIC_SCALE),
+            'nullable': row.IS_NULLABLE == 'YES',
+        }
+        for row in columns.itertuples(index=False)
+    ]
+
+
+def postgres_types_from_sqlserver(columns: list) -> dict:
+    """
+    Map SQL Server column definitions (see get_sqlserver_columns) to PostgreSQL types.
+    Character and unknown types become TEXT.
+    """
+    types = {}
+    for col in columns:
+        pg_type = SQLSERVER_TO_POSTGRES.get(col['data_type'], 'TEXT')
+        if pg_type == 'NUMERIC' and col['precision']:
+            pg_type = f"NUMERIC({col['precision']}, {col['scale'] or 0})"
+        types[col['name']] = pg_type
+    return types
+
+
+def postgres_types_from_dataframe(df: 'pd.DataFrame') -> dict:
+    """
+    Infer PostgreSQL types from DataFrame dtypes. Object columns are inspected
+    so that columns of dates, decimals, etc. are not flattened to TEXT.
+    """
+    import pandas as pd
+
+    types = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            pg_type = 'BOOLEAN'
+        elif pd.api.types.is_integer_dtype(series):
+            pg_type = 'BIGINT'
+        elif pd.api.types.is_float_dtype(series):
+            pg_type = 'DOUBLE PRECISION'
+        elif isinstance(series.dtype, pd.DatetimeTZDtype):
+            pg_type = 'TIMESTAMPTZ'
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            pg_type = 'TIMESTAMP'
+        else:
+            pg_type = {
+                'date': 'DATE',
+                'datetime': 'TIMESTAMP',
+                'datetime64': 'TIMESTAMP',
+                'decimal': 'NUMERIC',
+                'integer': 'BIGINT',
+                'boolean': 'BOOLEAN',
+                'time': 'TIME',
+            }.get(pd.api.types.infer_dtype(series, skipna=True), 'TEXT')
+        types[col] = pg_type
+    return types
+
+
+def create_table_sql(quoted_table_name, columns, column_types: dict, if_not_exists: bool = False,
+                     unlogged: bool = False) -> str:
+    """
+    Build a CREATE TABLE statement; columns missing from `column_types` are TEXT.
+    """
+    cols = ', '.join([f'"{col}" {column_types.get(col, "TEXT")}' for col in columns])
+    return (f'CREATE {"UNLOGGED " if unlogged else ""}TABLE {"IF NOT EXISTS " if if_not_exists else ""}'
+            f'{quoted_table_name} ({cols})')
+
+
+def coerce_to_types(df: 'pd.DataFrame', column_types: dict) -> 'pd.DataFrame':
+    """
+    Adjust values so their text form is accepted by COPY into `column_types`:
+    integral floats become integers (12.0 → 12) and zero fillers in
+    date/time columns become NULL.
+    """
+    import pandas as pd
+
+    df = df.copy(deep=False)
+    for col, pg_type in column_types.items():
+        if col not in df.columns:
+            continue
+        if pg_type in INTEGER_TYPES and pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype('Int64')
+        elif pg_type in TEMPORAL_TYPES and df[col].dtype == object:
+            df[col] = df[col].where(df[col].ne(0), None)
+    return df
+
+
+def postgres_table_types(cur, table_name, schema='public') -> dict:
+    """
+    Return the actual column types of an existing PostgreSQL table, in the
+    same spelling as the rest of this module (e.g. 'BIGINT', 'TIMESTAMP').
+    """
+    cur.execute("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND a.attnum > 0 AND NOT a.attisdropped
+    """, (schema, table_name))
+    aliases = {
+        'timestamp without time zone': 'TIMESTAMP',
+        'timestamp with time zone': 'TIMESTAMPTZ',
+        'time without time zone': 'TIME',
+    }
+    return {name: aliases.get(pg_type, pg_type.upper()) for name, pg_type in cur.fetchall()}
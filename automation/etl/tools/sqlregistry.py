@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import weakref
+from datetime import date, datetime, timedelta
+
+from tools.conn import pg_connection
+
+# Named, parameterized SQL statements.
+#
+# Statements come from two places:
+# - sql/<name>.sql files, for hand-written queries (e.g. dashboard reads);
+# - register(name, sql), for statements built from Python config at import
+#   time (tools.bitables, tools.storesales, tools.rollups, tools.pmrshelf).
+# Parameters are always bound as %(name)s, never pasted into the text.
+#
+# execute(..., prepare=True) turns a statement into a server-side prepared
+# statement the first time a pooled connection runs it and EXECUTEs it after
+# that, which pays off for statements run many times per session. Prepared
+# names are tracked per connection object, never per backend pid: pids are
+# reused once a pooled connection is closed and replaced.
+#
+# benchmark() runs statements under EXPLAIN (ANALYZE, BUFFERS), rolls their
+# effects back, and stores plans and timings per run in BENCHMARK_TABLE,
+# flagging statements that got slower or changed plan shape.
+#
+# Usage (from the ETL directory):
+#   python -m tools.sqlregistry --list
+#   python -m tools.sqlregistry --benchmark [--start 2025-07-01 --end 2025-07-03] [name ...]
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SQL_DIR = os.path.join(ETL_DIR, 'sql')
+BENCHMARK_TABLE = "etl_statement_benchmarks"
+# A statement is flagged when it runs this many times slower than its recent median
+REGRESSION_FACTOR = float(os.getenv('SQL_REGRESSION_FACTOR', 2))
+# Modules that register statements when imported
+REGISTERING_MODULES = ('tools.bitables', 'tools.storesales', 'tools.rollups', 'tools.pmrshelf')
+
+_PARAM = re.compile(r'%\((\w+)\)s')
+_statements = {}
+_prepared = weakref.WeakKeyDictionary()  # connection → names prepared on its session
+
+
+def register(name, sql):
+    """
+    Register `sql` under `name` (replacing any earlier definition).
+    """
+    _statements[name] = sql.strip()
+    return name
+
+
+def statement(name):
+    """
+    Return the SQL text registered as `name`, loading sql/<name>.sql on first use.
+    """
+    if name not in _statements:
+        path = os.path.join(SQL_DIR, f"{name}.sql")
+        if not os.path.exists(path):
+            raise KeyError(f"No SQL statement named '{name}'")
+        with open(path) as f:
+            register(name, f.read())
+    return _statements[name]
+
+
+def statement_names():
+    """
+    Return every known statement name: sql/*.sql files plus registered statements.
+    """
+    files = [f[:-4] for f in os.listdir(SQL_DIR) if f.endswith('.sql')] if os.path.isdir(SQL_DIR) else []
+    return sorted(set(files) | set(_statements))
+
+
+def execute(cur, name, params=None, prepare=False):
+    """
+    Run statement `name` on `cur` with bound `params` ({name: value}).
+
+    With `prepare`, the statement is PREPAREd once per database session and
+    EXECUTEd with positional arguments from then on.
+    """
+    sql = statement(name)
+    if not prepare:
+        cur.execute(sql, params or {})
+        return cur
+
+    order = list(dict.fromkeys(_PARAM.findall(sql)))
+    prepared = _prepared.setdefault(cur.connection, set())
+    if name not in prepared:
+        positional = _PARAM.sub(lambda m: f"${order.index(m.group(1)) + 1}", sql).replace('%%', '%')
+        cur.execute(f'PREPARE "{name}" AS {positional}')
+        prepared.add(name)
+
+    args = f"({', '.join(['%s'] * len(order))})" if order else ''
+    cur.execute(f'EXECUTE "{name}"{args}', [(params or {})[key] for key in order])
+    return cur
+
+
+def _plan_shape(node):
+    """
+    Node types of a JSON plan tree, e.g. 'Hash Join(Seq Scan,Hash(Index Scan))'.
+    """
+    children = ','.join([_plan_shape(child) for child in node.get('Plans', [])])
+    return node['Node Type'] + (f"({children})" if children else '')
+
+
+def ensure_benchmark_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{BENCHMARK_TABLE}" (
+            "run_id" TEXT NOT NULL,
+            "statement" TEXT NOT NULL,
+            "params" JSONB,
+            "planning_ms" DOUBLE PRECISION,
+            "execution_ms" DOUBLE PRECISION,
+            "shared_hit_blocks" BIGINT,
+            "shared_read_blocks" BIGINT,
+            "plan_shape" TEXT,
+            "plan" JSONB,
+            "measured_at" TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def benchmark(names=None, params=None, run_id=None):
+    """
+    Run each statement under EXPLAIN (ANALYZE, BUFFERS), undo its effects and
+    store its plan and timings as one row of BENCHMARK_TABLE.
+
+    Statements that fail (e.g. because a parameter they need is missing) are
+    reported and skipped.
+
+    Returns:
+        list: dicts with statement, planning_ms, execution_ms and regression notes.
+    """
+    run_id = run_id or datetime.now().isoformat(timespec='seconds')
+    params = params or {}
+    results = []
+
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            ensure_benchmark_table(cur)
+            for name in names or statement_names():
+                cur.execute("SAVEPOINT benchmark")
+                try:
+                    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement(name)}", params)
+                    raw = cur.fetchone()[0]
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT benchmark")
+                    print(f"❌ {name}: {str(e).strip()}")
+                    continue
+                # EXPLAIN ANALYZE really ran the statement; throw its changes away
+                cur.execute("ROLLBACK TO SAVEPOINT benchmark")
+
+                explained = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+                plan = explained['Plan']
+                shape = hashlib.md5(_plan_shape(plan).encode()).hexdigest()
+
+                cur.execute(f"""
+                    SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY "execution_ms"),
+                           (array_agg("plan_shape" ORDER BY "measured_at" DESC))[1]
+                    FROM (
+                        SELECT "execution_ms", "plan_shape", "measured_at" FROM "{BENCHMARK_TABLE}"
+                        WHERE "statement" = %s ORDER BY "measured_at" DESC LIMIT 5
+                    ) recent
+                """, (name,))
+                median, last_shape = cur.fetchone()
+
+                result = {
+                    'statement': name,
+                    'planning_ms': explained.get('Planning Time'),
+                    'execution_ms': explained.get('Execution Time'),
+                    'notes': [],
+                }
+                if median and result['execution_ms'] > REGRESSION_FACTOR * median:
+                    result['notes'].append(f"{result['execution_ms'] / median:.1f}x slower than recent median")
+                if last_shape and last_shape != shape:
+                    result['notes'].append("plan shape changed")
+
+                cur.execute(f"""
+                    INSERT INTO "{BENCHMARK_TABLE}"
+                    ("run_id", "statement", "params", "planning_ms", "execution_ms",
+                     "shared_hit_blocks", "shared_read_blocks", "plan_shape", "plan")
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (run_id, name, json.dumps(params, default=str), result['planning_ms'], result['execution_ms'],
+                      plan.get('Shared Hit Blocks'), plan.get('Shared Read Blocks'), shape, json.dumps(explained)))
+
+                flag = f" ⚠️ {'; '.join(result['notes'])}" if result['notes'] else ''
+                print(f"⏱️ {name}: planning {result['planning_ms']:.1f} ms, "
+                      f"execution {result['execution_ms']:.1f} ms{flag}")
+                results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    import importlib
+
+    for module in REGISTERING_MODULES:
+        importlib.import_module(module)
+
+    yesterday = date.today() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="List or benchmark the registered SQL statements.")
+    parser.add_argument('names', nargs='*', help="statements to benchmark (default: all)")
+    parser.add_argument('--list', action='store_true', help="list statement names and exit")
+    parser.add_argument('--benchmark', action='store_true', help="run statements under EXPLAIN (ANALYZE, BUFFERS)")
+    parser.add_argument('--start', default=str(yesterday), help="start of the date window (default: yesterday)")
+    parser.add_argument('--end', default=str(yesterday), help="end of the date window (default: yesterday)")
+    parser.add_argument('--source', default='StoreSalesByUPC', help="StoreSales source tag for slice statements")
+    args = parser.parse_args()
+
+    if args.list or not args.benchmark:
+        print('\n'.join(statement_names()))
+    else:
+        after = str(date.fromisoformat(args.end) + timedelta(days=1))
+        benchmark(args.names, {
+            'start': args.start, 'end': args.end, 'after': after,
+            'first': args.start, 'source': args.source,
+        })
@@ -0,0 +1,92 @@
+import os
+import pandas as pd
+
+# Typed, compressed staging files for extracted tables.
+# Parquet (via pyarrow) keeps column types across a write/read round-trip and
+# supports column projection; CSV is kept as a fallback when pyarrow is not
+# installed.
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+DEFAULT_FORMAT = 'parquet' if pq is not None else 'csv'
+
+
+def staging_path(output_dir, db_name, table, fmt=DEFAULT_FORMAT):
+    """
+    Return the staging file path for `table`, e.g. ./exported_tables/db_table.parquet.
+    """
+    return os.path.join(output_dir, f"{db_name}_{table}.{fmt}")
+
+
+class StagingWriter:
+    """
+    Append DataFrame chunks to a staging file.
+
+    Every chunk is written with the schema of the first one; columns that were
+    entirely null in the first chunk are staged as strings.
+    """
+
+    def __init__(self, path, fmt=DEFAULT_FORMAT, compression='zstd'):
+        if fmt == 'parquet' and pq is None:
+            raise ImportError("pyarrow is required for parquet staging (pip install pyarrow)")
+        self.path = path
+        self.fmt = fmt
+        self.compression = compression
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+        # ✅ Remove existing file to start fresh
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, chunk: pd.DataFrame):
+        if self.fmt == 'csv':
+            chunk.to_csv(self.path, mode='a', index=False, header=self.rows == 0)
+            self.rows += len(chunk)
+            return
+
+        if self._writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            self._schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]).remove_metadata()
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+
+        try:
+            table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. an integer column that picked up NaNs and became float in this chunk
+            table = pa.Table.from_pandas(chunk, preserve_index=False).cast(self._schema)
+        self._writer.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_staged(path, columns=None) -> pd.DataFrame:
+    """
+    Read a staging file back into a DataFrame.
+
+    Parquet files are memory-mapped and only `columns` (all if None) are
+    decoded, so partial reads of wide tables stay cheap.
+    """
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is required to read parquet staging files (pip install pyarrow)")
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return pd.read_csv(path, usecols=columns)
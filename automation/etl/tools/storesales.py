@@ -0,0 +1,175 @@
+import os
+from datetime import date, timedelta
+
+from tools.conn import pg_connection
+from tools.pgpartitions import prepare_partitions
+from tools.sqlregistry import register, execute
+
+# Incremental refresh of the Metabase "StoreSales" table.
+#
+# StoreSales is the union of the three BI tables, tagged with a "Source"
+# column. Instead of appending "everything since yesterday" (which duplicates
+# a day on every rerun), each refresh fingerprints every (source, Sales_Date)
+# slice of the BI tables, compares it with the fingerprint recorded by the
+# previous refresh, and atomically replaces only the slices that changed.
+#
+# Date filters are written as half-open ranges against the bare column with
+# untyped literals ("Sales_Date" >= '2025-01-01' AND "Sales_Date" < '2025-01-02'),
+# so they can use an index whether Sales_Date is stored as DATE, TIMESTAMP or
+# ISO-formatted TEXT, and so the planner can prune StoreSales' monthly
+# partitions (see tools/pgpartitions.py).
+
+STORESALES_TABLE = "StoreSales"
+STATE_TABLE = "storesales_refresh_state"
+LOOKBACK_DAYS = int(os.getenv('STORESALES_LOOKBACK_DAYS', 7))
+
+STORESALES_COLUMNS = [
+    "Sales_Date", "Store", "SBO_ProductId", "PRO5_ProductId", "SKU",
+    "Prod_Brand", "Prod_Descr", "Prod_PackSize", "ItemGroup",
+    "Department", "SubDepartment", "POSDepartment",
+    "Qty_Sold", "Total_Sold", "Weight_Sold",
+]
+
+# Source tag → (BI table, {StoreSales column: expression}); columns left out are copied as-is
+_NO_PRODUCT = {
+    "SBO_ProductId": "0", "PRO5_ProductId": "0",
+    "Prod_Brand": "NULL", "Prod_Descr": "NULL", "Prod_PackSize": "NULL", "ItemGroup": "NULL",
+    "Department": "NULL", "SubDepartment": "NULL", "POSDepartment": "NULL",
+}
+STORESALES_SOURCES = {
+    'StoreSalesByUPC': ("StoreSalesByUPC_2024_to_Q1_2025", {}),
+    'StoreSaleByDept': ("StoreSaleByDept_2024_to_Q1_2025", _NO_PRODUCT),
+    'StoreSalesUnkUPC': ("StoreSalesUnkUPC_2024_to_Q1_2025", _NO_PRODUCT),
+}
+
+
+register("storesales_delete_slice", f"""
+    DELETE FROM "{STORESALES_TABLE}"
+    WHERE "Source" = %(source)s AND "Sales_Date" >= %(first)s AND "Sales_Date" < %(after)s
+""")
+for _source, (_bi_table, _expressions) in STORESALES_SOURCES.items():
+    register(f"storesales_insert_slice_{_source}", f"""
+        INSERT INTO "{STORESALES_TABLE}" ({', '.join([f'"{col}"' for col in STORESALES_COLUMNS] + ['"Source"'])})
+        SELECT {', '.join([_expressions.get(col, f'"{col}"') for col in STORESALES_COLUMNS] + ['%(source)s'])}
+        FROM "{_bi_table}"
+        WHERE "Sales_Date" >= %(first)s AND "Sales_Date" < %(after)s
+    """)
+
+
+def ensure_state_table(cur):
+    """
+    Create the per-(source, day) fingerprint table if it does not exist yet.
+    """
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{STATE_TABLE}" (
+            "source" TEXT NOT NULL,
+            "sales_date" DATE NOT NULL,
+            "row_count" BIGINT NOT NULL,
+            "checksum" NUMERIC NOT NULL,
+            "refreshed_at" TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY ("source", "sales_date")
+        )
+    """)
+
+
+def day_fingerprints(cur, bi_table, start, end):
+    """
+    Return {day: (row_count, checksum)} for the Sales_Date days of `bi_table` in [start, end].
+    The checksum is an order-independent sum of row hashes, so any insert,
+    delete or update inside a day changes it.
+    """
+    cur.execute(f"""
+        SELECT t."Sales_Date"::date, count(*), sum(hashtextextended(t::text, 0))
+        FROM "{bi_table}" t
+        WHERE t."Sales_Date" >= %s AND t."Sales_Date" < %s
+        GROUP BY 1
+    """, (str(start), str(end + timedelta(days=1))))
+    return {day: (rows, checksum) for day, rows, checksum in cur.fetchall()}
+
+
+def recorded_fingerprints(cur, source, start, end):
+    """
+    Return {day: (row_count, checksum)} recorded for `source` by earlier refreshes.
+    """
+    cur.execute(f"""
+        SELECT "sales_date", "row_count", "checksum" FROM "{STATE_TABLE}"
+        WHERE "source" = %s AND "sales_date" BETWEEN %s AND %s
+    """, (source, start, end))
+    return {day: (rows, checksum) for day, rows, checksum in cur.fetchall()}
+
+
+def day_ranges(days):
+    """
+    Collapse days into half-open [first, after_last) ranges of consecutive days.
+    """
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return [tuple(r) for r in ranges]
+
+
+def replace_slices(cur, source, days):
+    """
+    Delete and re-insert the StoreSales rows of `source` for `days`.
+
+    Returns:
+        tuple: (rows deleted, rows inserted)
+    """
+    deleted = inserted = 0
+    for first, after in day_ranges(days):
+        params = {'source': source, 'first': str(first), 'after': str(after)}
+        execute(cur, "storesales_delete_slice", params, prepare=True)
+        deleted += cur.rowcount
+        execute(cur, f"storesales_insert_slice_{source}", params, prepare=True)
+        inserted += cur.rowcount
+    return deleted, inserted
+
+
+def refresh_store_sales(start=None, end=None):
+    """
+    Bring StoreSales in line with the BI tables for Sales_Date in [start, end].
+
+    Defaults to the last STORESALES_LOOKBACK_DAYS days. Only (source, day)
+    slices whose fingerprint changed since the last refresh are replaced, all
+    in one transaction, so reruns are idempotent and upstream corrections
+    inside the window are picked up automatically.
+
+    Returns:
+        dict: {source: {'days': changed days, 'deleted': rows, 'inserted': rows}}
+    """
+    end = date.fromisoformat(str(end)[:10]) if end else date.today()
+    start = date.fromisoformat(str(start)[:10]) if start else end - timedelta(days=LOOKBACK_DAYS)
+
+    report = {}
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            ensure_state_table(cur)
+            prepare_partitions(cur, STORESALES_TABLE, start, end)
+
+            for source, (bi_table, _) in STORESALES_SOURCES.items():
+                current = day_fingerprints(cur, bi_table, start, end)
+                recorded = recorded_fingerprints(cur, source, start, end)
+                changed = {day for day in current.keys() | recorded.keys() if current.get(day) != recorded.get(day)}
+
+                deleted, inserted = replace_slices(cur, source, changed) if changed else (0, 0)
+
+                gone = [day for day in changed if day not in current]
+                if gone:
+                    cur.execute(f'DELETE FROM "{STATE_TABLE}" WHERE "source" = %s AND "sales_date" = ANY(%s)',
+                                (source, gone))
+                for day in changed - set(gone):
+                    rows, checksum = current[day]
+                    cur.execute(f"""
+                        INSERT INTO "{STATE_TABLE}" ("source", "sales_date", "row_count", "checksum", "refreshed_at")
+                        VALUES (%s, %s, %s, %s, now())
+                        ON CONFLICT ("source", "sales_date") DO UPDATE
+                        SET "row_count" = EXCLUDED."row_count", "checksum" = EXCLUDED."checksum", "refreshed_at" = now()
+                    """, (source, day, rows, checksum))
+
+                report[source] = {'days': len(changed), 'deleted': deleted, 'inserted': inserted}
+                print(f"🔁 {source}: {len(changed)} changed day(s), {deleted} rows replaced, {inserted} rows inserted")
+
+    return report
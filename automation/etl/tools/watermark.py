@@ -0,0 +1,61 @@
+from tools.conn import pg_connection
+
+# This module keeps one high-watermark per (source table, watermark column) in
+# PostgreSQL, so incremental extractions can resume exactly where the last
+# successful load stopped.
+
+WATERMARK_TABLE = "etl_watermarks"
+
+
+def ensure_watermark_table(cur):
+    """
+    Create the watermark state table if it does not exist yet.
+    """
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{WATERMARK_TABLE}" (
+            "source_table" TEXT NOT NULL,
+            "watermark_column" TEXT NOT NULL,
+            "high_watermark" TEXT NOT NULL,
+            "updated_at" TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY ("source_table", "watermark_column")
+        )
+    """)
+
+
+def get_watermark(cur, source_table, column):
+    """
+    Return the stored high-watermark for `source_table`.`column`, or None.
+    """
+    ensure_watermark_table(cur)
+    cur.execute(f"""
+        SELECT "high_watermark" FROM "{WATERMARK_TABLE}"
+        WHERE "source_table" = %s AND "watermark_column" = %s
+    """, (source_table, column))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def advance_watermark(cur, source_table, column, value):
+    """
+    Store `value` as the new high-watermark for `source_table`.`column`.
+
+    Meant to be called on the same cursor/transaction as the load it
+    describes, so the watermark only moves if that load commits.
+    """
+    ensure_watermark_table(cur)
+    cur.execute(f"""
+        INSERT INTO "{WATERMARK_TABLE}" ("source_table", "watermark_column", "high_watermark", "updated_at")
+        VALUES (%s, %s, %s, now())
+        ON CONFLICT ("source_table", "watermark_column")
+        DO UPDATE SET "high_watermark" = EXCLUDED."high_watermark", "updated_at" = now()
+    """, (source_table, column, str(value)))
+    print(f"🔖 Watermark {source_table}.{column} → {value}")
+
+
+def read_watermark(source_table, column):
+    """
+    Convenience wrapper around get_watermark that borrows a pooled connection.
+    """
+    with pg_connection() as conn:
+        with conn.cursor() as cur:
+            return get_watermark(cur, source_table, column)